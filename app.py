@@ -1,15 +1,57 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+import numpy as np
 from datetime import datetime, date
 import qrcode
 import base64
+import queue
+import socket
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import ExitStack, contextmanager
+from functools import partial
 from io import BytesIO
 
+try:
+    import psycopg2
+    import psycopg2.pool
+except ImportError:        # only needed when STORAGE_BACKEND = "postgres"
+    psycopg2 = None
+
 # ─────────────────────────────────────────────
 #  CONFIGURATION
 # ─────────────────────────────────────────────
 DB_PATH = "rcb_inventory.db"
+DB_TIMEOUT_S = 30          # how long a connection waits on a locked database
+
+# Extra plants, one database file each, e.g. {"Plant 2": "rcb_inventory_plant2.db"}.
+# Plant 1 is always DB_PATH (see sites()). With more than one site a session
+# picks its site in the sidebar and the head-office view fans dashboard /
+# records reads out across all of them.
+EXTRA_SITES = {}
+
+# Pages talk to a storage backend (see STORAGE BACKENDS below): "sqlite" uses the
+# site files above; "postgres" uses one database per site named by POSTGRES_DSN.
+# Search, reactor trends, quality correlation and shift reports are built on
+# SQLite-only features (FTS5, trigger-fed rollups) and are hidden under "postgres".
+STORAGE_BACKEND = "sqlite"
+POSTGRES_DSN    = "dbname=rcb_{site}"   # {site} -> "plant_1", "plant_2", ...
+PG_POOL_MIN     = 2
+PG_POOL_MAX     = 20
+
+# All writes go through one writer thread (see WRITE QUEUE below)
+WRITE_QUEUE_MAX = 1000     # pending ops before submitters block
+WRITE_BATCH_MAX = 200      # ops folded into one group commit
+
+# Per-session caches of page reads (see QUERY CACHE below). Writes through this
+# process invalidate per table; the TTL bounds staleness from other processes.
+QUERY_CACHE_TTL_S   = 60
+QUERY_CACHE_ENTRIES = 64       # per session
+QUERY_CACHE_MAX_MB  = 256      # shared by all sessions in the process
 
 USERS = {
     "admin":    "admin1234",
@@ -18,6 +60,27 @@ USERS = {
 
 PRODUCTS = ["Revolution CB", "Paris CB"]
 
+# Thermal label printer (raw TCP / JetDirect). printer_stub.py stands in for testing.
+PRINTER_HOST      = "127.0.0.1"
+PRINTER_PORT      = 9100
+PRINTER_TIMEOUT_S = 5
+PRINT_BATCH_MAX   = 200    # labels per printer connection
+LABEL_WIDTH_DOTS  = 812    # 4 x 6 in @ 203 dpi
+LABEL_HEIGHT_DOTS = 1218
+
+# Reactor telemetry channels stored in process_logs (and rolled up per minute / hour)
+PROCESS_CHANNELS = [
+    "toluene_value", "feed_rate",
+    "reactor_1_temp", "reactor_2_temp",
+    "reactor_1_hz", "reactor_2_hz",
+]
+
+# Pre-computed shift / customer / bagging reports (see REPORT SCHEDULER below)
+REPORT_INTERVAL_S = 60     # background refresh cadence
+REPORT_WAIT_S     = 5      # how long "Refresh now" waits for the refresh it asked for
+SHIFT_START_HOUR  = 6      # day shift 06:00-18:00, night shift 18:00-06:00
+SHIFT_HOURS       = 12
+
 # ─────────────────────────────────────────────
 #  QC REJECTION LIMITS  (set max/min to None to disable)
 # ─────────────────────────────────────────────
@@ -41,13 +104,27 @@ def qc_check(moist, ash, hard, tol):
         failures.append(f"Toluene {tol} exceeds max {QC_LIMITS['toluene']['max']}")
     return failures
 
+
+def qc_fail_mask(df: pd.DataFrame) -> pd.Series:
+    """Vectorized qc_check over a DataFrame of QC columns. True = FAIL."""
+    mask = pd.Series(False, index=df.index)
+    for col, lim in QC_LIMITS.items():
+        if lim["max"] is not None:
+            mask |= df[col] > lim["max"]
+        if lim["min"] is not None:
+            mask |= df[col] < lim["min"]
+    return mask
+
 # ─────────────────────────────────────────────
 #  DATABASE
 # ─────────────────────────────────────────────
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
+def init_db(path: str = None):
+    conn = sqlite3.connect(path or site_db(), timeout=DB_TIMEOUT_S)
     c = conn.cursor()
 
+    # WAL lets readers keep going while the writer thread commits
+    c.execute("PRAGMA journal_mode=WAL")
+
     c.execute("""
         CREATE TABLE IF NOT EXISTS test_results (
             id              INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -94,9 +171,31 @@ def init_db():
             product         TEXT,
             bag_size_unit   TEXT,
             quantity        INTEGER,
-            pallet_id       TEXT
+            pallet_id       TEXT,
+            run_ref         TEXT
         )
     """)
+    try:
+        c.execute("ALTER TABLE bagging_ops ADD COLUMN run_ref TEXT")
+    except sqlite3.OperationalError:
+        pass
+
+    # FIFO head / count per product without touching shipped history
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_test_results_fifo ON test_results(product, status, timestamp)"
+    )
+
+    # Slot occupancy checks only ever look at in-stock bags
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_test_results_inv_loc ON test_results(location_id) WHERE status='Inventory'"
+    )
+
+    # Time-range reads (quality correlation, reports) seek on timestamp
+    c.execute("CREATE INDEX IF NOT EXISTS idx_test_results_ts ON test_results(timestamp)")
+
+    # Scan lookups: box QR payloads resolve through run_ref (or pallet_id)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bagging_ops_run_ref ON bagging_ops(run_ref)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_bagging_ops_pallet ON bagging_ops(pallet_id)")
 
     # Individual small bags produced from a bagging run
     c.execute("""
@@ -123,6 +222,52 @@ def init_db():
         )
     """)
 
+    # Reactor telemetry (raw samples) + downsampled rollups for trend charts.
+    # Timestamps are 'YYYY-MM-DD HH:MM:SS.ffffff' text, so a bucket is a prefix.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS process_logs (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp       DATETIME,
+            operator        TEXT,
+            toluene_value   REAL,
+            feed_rate       REAL,
+            reactor_1_temp  REAL,
+            reactor_2_temp  REAL,
+            reactor_1_hz    REAL,
+            reactor_2_hz    REAL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_process_logs_ts ON process_logs(timestamp)")
+
+    # Customer report refreshes look up shipments by day
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_test_results_shipped ON test_results(shipped_date) WHERE status='Shipped'"
+    )
+
+    # n counts samples; {ch}_n counts each channel's non-NULL samples, which
+    # is what its average is weighted by when minutes roll up into hours
+    rollup_cols = ",\n".join(
+        f"{ch}_avg REAL, {ch}_min REAL, {ch}_max REAL, {ch}_n INTEGER" for ch in PROCESS_CHANNELS
+    )
+    for table in ("process_logs_1m", "process_logs_1h"):
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                bucket  TEXT PRIMARY KEY,
+                n       INTEGER,
+                {rollup_cols}
+            )
+        """)
+        have = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+        missing = [f"{ch}_n" for ch in PROCESS_CHANNELS if f"{ch}_n" not in have]
+        for col in missing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {col} INTEGER")
+        if missing:
+            c.execute(f"DELETE FROM {table}")    # rebuilt below, now with per-channel counts
+    backfill_rollups(c)
+
+    init_search_index(c)
+    init_reports(c)
+
     c.execute("SELECT COUNT(*) FROM locations")
     if c.fetchone()[0] == 0:
         for i in range(1, 101):
@@ -135,19 +280,1446 @@ def init_db():
     conn.close()
 
 
-def get_conn():
-    return sqlite3.connect(DB_PATH)
+# ─────────────────────────────────────────────
+#  FULL-TEXT SEARCH  (FTS5 over supersacks, bagging runs, small bags)
+# ─────────────────────────────────────────────
+# source table -> (rowid tag, kind label, {index column: source expression}, UPDATE OF columns)
+# rowid = source id * 4 + tag, so each source row maps to exactly one index row.
+SEARCH_SOURCES = {
+    "test_results": (1, "Supersack", {
+        "ref": "bag_ref", "customer_name": "customer_name", "shipped_by": "shipped_by",
+        "pallet_id": "NULL", "source_sack_id": "NULL", "operator": "operator",
+        "product": "product", "status": "status", "ts": "timestamp",
+    }, "bag_ref, customer_name, shipped_by, operator, product, status"),
+    "bagging_ops": (2, "Bagging Run", {
+        "ref": "run_ref", "customer_name": "NULL", "shipped_by": "NULL",
+        "pallet_id": "pallet_id", "source_sack_id": "source_sack_id", "operator": "operator",
+        "product": "product", "status": "NULL", "ts": "timestamp",
+    }, "run_ref, pallet_id, source_sack_id, operator, product"),
+    "small_bags": (3, "Small Bag", {
+        "ref": "bag_ref", "customer_name": "customer_name", "shipped_by": "shipped_by",
+        "pallet_id": "pallet_id", "source_sack_id": "source_sack_id", "operator": "operator",
+        "product": "product", "status": "status", "ts": "timestamp",
+    }, "bag_ref, customer_name, shipped_by, pallet_id, source_sack_id, operator, product, status"),
+}
+SEARCH_COLS = ["ref", "customer_name", "shipped_by", "pallet_id", "source_sack_id", "operator",
+               "product", "status", "ts"]
+SEARCH_LIMIT = 100
+
+# '-' and '_' are token characters so IDs like PAL-001 / RCB-20240101-120000
+# stay whole; prefix indexes answer 1-4 character prefixes without walking terms
+SEARCH_INDEX_SQL = """CREATE VIRTUAL TABLE search_index USING fts5(
+    ref, customer_name, shipped_by, pallet_id, source_sack_id, operator,
+    product UNINDEXED, status UNINDEXED, ts UNINDEXED,
+    tokenize = "unicode61 tokenchars '-_'",
+    prefix = '1 2 3 4'
+)"""
+
+
+def init_search_index(c):
+    """Create the FTS5 index and its sync triggers; (re)build it when new or its definition changed."""
+    c.execute("SELECT sql FROM sqlite_master WHERE name='search_index'")
+    current = c.fetchone()
+    is_new = current is None or current[0] != SEARCH_INDEX_SQL
+    if is_new:
+        c.execute("DROP TABLE IF EXISTS search_index")
+        c.execute(SEARCH_INDEX_SQL)
+
+    cols = ", ".join(SEARCH_COLS)
+    for table, (tag, _, exprs, watched) in SEARCH_SOURCES.items():
+        new_vals = ", ".join(f"new.{exprs[col]}" if exprs[col] != "NULL" else "NULL" for col in SEARCH_COLS)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_ins AFTER INSERT ON {table} BEGIN
+                INSERT INTO search_index (rowid, {cols}) VALUES (new.id * 4 + {tag}, {new_vals});
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_upd AFTER UPDATE OF {watched} ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = old.id * 4 + {tag};
+                INSERT INTO search_index (rowid, {cols}) VALUES (new.id * 4 + {tag}, {new_vals});
+            END
+        """)
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_search_del AFTER DELETE ON {table} BEGIN
+                DELETE FROM search_index WHERE rowid = old.id * 4 + {tag};
+            END
+        """)
+        if is_new:
+            src_vals = ", ".join(exprs[col] for col in SEARCH_COLS)
+            c.execute(f"INSERT INTO search_index (rowid, {cols}) SELECT id * 4 + {tag}, {src_vals} FROM {table}")
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, each as a prefix."""
+    words = [w.replace('"', '""') for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search(conn, text: str, limit: int = SEARCH_LIMIT) -> pd.DataFrame:
+    """
+    Prefix search across all SEARCH_SOURCES, latest rows (highest id)
+    first. Ordering by rowid lets FTS5 stop after `limit` matches;
+    ORDER BY rank would score every match first.
+    """
+    kinds = " ".join(f"WHEN {tag} THEN '{kind}'" for tag, kind, _, _ in SEARCH_SOURCES.values())
+    return pd.read_sql_query(
+        f"""SELECT CASE rowid % 4 {kinds} END AS kind, {", ".join(SEARCH_COLS)}
+            FROM search_index
+            WHERE search_index MATCH ?
+            ORDER BY rowid DESC
+            LIMIT ?""",
+        conn, params=(fts_query(text), int(limit)),
+    )
+
+
+def sites() -> dict:
+    """site -> database file. Built on each call, so scripts that repoint DB_PATH stay in step."""
+    return {"Plant 1": DB_PATH, **EXTRA_SITES}
 
 
-def get_next_loc():
-    conn = get_conn()
-    c = conn.cursor()
+def site_db(site: str = None) -> str:
+    """Database file for `site` (default: this session's site; DB_PATH outside a session)."""
+    site = site or st.session_state.get("site")
+    return sites().get(site, DB_PATH)
+
+
+def get_conn(path: str = None):
+    return sqlite3.connect(path or site_db(), timeout=DB_TIMEOUT_S)
+
+
+@contextmanager
+def snapshot_conn(path: str = None):
+    """
+    Read-only connection pinned to a single WAL snapshot for its lifetime.
+    Every query a page runs inside the block sees the same committed state,
+    and because WAL readers never take the write lock, long analytics
+    scans cannot stall production or shipping writes.
+    """
+    conn = sqlite3.connect(path or site_db(), timeout=DB_TIMEOUT_S, isolation_level=None)
+    try:
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("BEGIN")
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1")   # the first read fixes the snapshot
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+# ─────────────────────────────────────────────
+#  TYPED FRAMES  (compact DataFrames for the read pages)
+# ─────────────────────────────────────────────
+# Low-cardinality text -> category; integer QC fields -> nullable Int16;
+# measurements stay float64 so sums and CSV exports keep the stored values;
+# timestamps parsed once
+CATEGORY_COLS = {
+    "site", "product", "status", "operator", "customer_name", "shipped_by",
+    "location_id", "shipped_date", "bag_size_unit", "pallet_id",
+}
+COMPACT_DTYPES = {
+    "weight_lbs":      "float64",
+    "moisture":        "float64",
+    "ash_content":     "float64",
+    "pellet_hardness": "Int16",     # NULL QC reads as pd.NA
+    "toluene":         "Int16",
+    "quantity":        "Int32",
+}
+
+# Columns each page actually reads
+DASHBOARD_COLS = [
+    "timestamp", "bag_ref", "product", "location_id", "status", "weight_lbs",
+    "customer_name", "pellet_hardness", "moisture", "toluene", "ash_content",
+]
+RECORDS_COLS = [
+    "bag_ref", "timestamp", "operator", "product", "location_id", "status",
+    "customer_name", "shipped_date", "shipped_by", "weight_lbs",
+    "pellet_hardness", "moisture", "toluene", "ash_content",
+]
+SMALL_BAG_COLS = [
+    "bag_ref", "timestamp", "operator", "product", "bag_size_unit", "source_sack_id",
+    "pallet_id", "status", "customer_name", "shipped_date", "shipped_by",
+]
+BAGGING_RUN_COLS = [
+    "run_ref", "timestamp", "operator", "source_sack_id", "product",
+    "bag_size_unit", "quantity", "pallet_id",
+]
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast a freshly read frame in place using CATEGORY_COLS / COMPACT_DTYPES."""
+    for col in df.columns:
+        if col in CATEGORY_COLS:
+            df[col] = df[col].astype("category")
+        elif col in COMPACT_DTYPES:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(COMPACT_DTYPES[col])
+        elif col == "timestamp":
+            df[col] = pd.to_datetime(df[col], format="ISO8601")
+    return df
+
+
+def select_sql(table: str, cols: list, where: str = "", order: str = "", limit: int = None, offset: int = 0) -> str:
+    sql = f"SELECT {', '.join(cols)} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    if order:
+        sql += f" ORDER BY {order}"
+    if limit is not None:
+        sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+    return sql
+
+
+def read_typed(conn, table: str, cols: list, where: str = "", params=(), order: str = "",
+               limit: int = None, offset: int = 0) -> pd.DataFrame:
+    """SELECT only `cols` from `table` and return a compact-typed frame."""
+    sql = select_sql(table, cols, where, order, limit, offset)
+    return compact_frame(pd.read_sql_query(sql, conn, params=params))
+
+
+# ─────────────────────────────────────────────
+#  MULTI-SITE FEDERATION  (head-office reads across plant databases)
+# ─────────────────────────────────────────────
+# Bag / run IDs are only unique within a site, so merged frames prefix them with it
+SITE_ID_COLS = ["bag_ref", "run_ref", "source_sack_id"]
+
+
+def fan_out(read, site_names: list = None) -> tuple:
+    """
+    Run read(reader) -> tuple of DataFrames against every site in parallel,
+    each inside its own storage snapshot, and stack the per-site frames with a
+    leading 'site' column and site-qualified IDs ('Plant 2/RCB-...'). Sites
+    are never ATTACHed to one another, so a head-office scan takes no locks a
+    plant's writer could wait on.
+    """
+    site_names = site_names or list(sites())
+    cache = query_cache()                     # worker threads have no session of their own
+
+    def one(site):
+        with get_storage(site).snapshot(cache) as reader:
+            frames = read(reader)
+        for df in frames:
+            for col in SITE_ID_COLS:
+                if col in df:
+                    df[col] = f"{site}/" + df[col].astype("string")
+            df.insert(0, "site", site)
+        return frames
+
+    with ThreadPoolExecutor(max_workers=len(site_names), thread_name_prefix="rcb-fan-out") as pool:
+        per_site = list(pool.map(one, site_names))
+    return tuple(compact_frame(pd.concat(parts, ignore_index=True)) for parts in zip(*per_site))
+
+
+def read_scope(read) -> tuple:
+    """read(reader) for this session's site, or fanned out across all sites in the head-office view."""
+    if st.session_state.get("all_sites"):
+        return fan_out(read)
+    with get_storage().snapshot() as reader:
+        return read(reader)
+
+
+# ─────────────────────────────────────────────
+#  QUERY CACHE  (per-session, invalidated per table by writes)
+# ─────────────────────────────────────────────
+# Every committed write bumps a version per (database, table) it touched;
+# a cached read is reused only while its table's version is unchanged.
+# Write ops declare their tables with @writes(...); an undeclared op bumps
+# the whole database. Writers hold TableVersions.lock across COMMIT and the
+# bump, and readers open their snapshot under it, so the versions a reader
+# copies describe exactly the rows its snapshot sees.
+class TableVersions:
+    def __init__(self):
+        self.lock     = threading.RLock()   # writers re-enter it in bump_tables
+        self.versions = {}         # (db, table) -> int
+
+
+@st.cache_resource
+def get_table_versions() -> TableVersions:
+    """Process-wide, so it survives script reruns and is shared by all sessions and writers."""
+    return TableVersions()
+
+
+def writes(*tables):
+    """Declare the tables a write op changes, for query-cache invalidation."""
+    def mark(op):
+        op.tables = tables
+        return op
+    return mark
+
+
+def bump_tables(db: str, tables):
+    tv = get_table_versions()
+    with tv.lock:
+        for table in tables or ("*",):
+            tv.versions[(db, table)] = tv.versions.get((db, table), 0) + 1
+
+
+class QueryBudget:
+    """
+    The byte budget every session's QueryCache shares. When the process
+    total goes over it, the least recently used entry of any session goes
+    first, so idle sessions give way to busy ones.
+    """
+
+    def __init__(self, max_mb: float = QUERY_CACHE_MAX_MB):
+        self.max_bytes = max_mb * 1e6
+        self.nbytes    = 0
+        self.caches    = weakref.WeakSet()    # a closed session's cache leaves with it
+        self.lock      = threading.Lock()     # shared by all caches; fan_out reads from worker threads
+
+
+@st.cache_resource
+def get_query_budget() -> QueryBudget:
+    return QueryBudget()
+
+
+class QueryCache:
+    """
+    LRU of read results keyed by (database, SQL, params), bounded by entry
+    count here and by bytes across the process (see QueryBudget).
+    """
+
+    def __init__(self, ttl_s: float = QUERY_CACHE_TTL_S, max_entries: int = QUERY_CACHE_ENTRIES,
+                 budget: QueryBudget = None):
+        self.ttl_s       = ttl_s
+        self.max_entries = max_entries
+        self.budget      = budget or get_query_budget()
+        self.entries     = OrderedDict()      # key -> (expires, version, nbytes, frame, last_used)
+        self.nbytes      = 0
+        self.stats       = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock       = self.budget.lock
+        with self._lock:
+            self.budget.caches.add(self)
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self.entries.get(key)
+            now = time.monotonic()
+            if entry and entry[0] > now and entry[1] == version:
+                self.entries[key] = entry[:4] + (now,)
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[3].copy(deep=False)   # callers may add columns
+            if entry:
+                self._drop(key)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, version, df: pd.DataFrame):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.budget.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                self._drop(key)
+            now = time.monotonic()
+            self.entries[key] = (now + self.ttl_s, version, nbytes, df.copy(deep=False), now)
+            self.nbytes += nbytes
+            self.budget.nbytes += nbytes
+            while len(self.entries) > self.max_entries:
+                self._evict(self)
+            while self.budget.nbytes > self.budget.max_bytes:
+                self._evict(min((c for c in self.budget.caches if c.entries),
+                                key=lambda c: next(iter(c.entries.values()))[4]))
+
+    @staticmethod
+    def _evict(cache):
+        cache._drop(next(iter(cache.entries)))
+        cache.stats["evictions"] += 1
+
+    def _drop(self, key):
+        nbytes = self.entries.pop(key)[2]
+        self.nbytes -= nbytes
+        self.budget.nbytes -= nbytes
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+
+def query_cache() -> QueryCache:
+    """This browser session's QueryCache."""
+    if "query_cache" not in st.session_state:
+        st.session_state["query_cache"] = QueryCache()
+    return st.session_state["query_cache"]
+
+
+@contextmanager
+def cached_snapshot(db: str, open_snapshot, cache):
+    """
+    Reader (read_typed signature minus conn) over one backend snapshot,
+    opened via open_snapshot(), that answers repeat reads from `cache`.
+    The snapshot opens and the table versions are copied together under
+    TableVersions.lock; hits are accepted and misses stored only at those
+    versions, so every frame a block reads, cached or not, comes from the
+    same commit — as with one read snapshot per page.
+    """
+    tv = get_table_versions()
+    with ExitStack() as stack:
+        with tv.lock:
+            inner  = stack.enter_context(open_snapshot())
+            pinned = dict(tv.versions)
+
+        def read(table, cols, where="", params=(), order="", limit=None, offset=0):
+            key = (db, select_sql(table, cols, where, order, limit, offset), tuple(params))
+            version = pinned.get((db, table), 0), pinned.get((db, "*"), 0)
+            if cache is not None:
+                df = cache.get(key, version)
+                if df is not None:
+                    return df
+            df = inner(table, cols, where, params, order, limit, offset)
+            if cache is not None:
+                cache.put(key, version, df)
+            return df
+
+        yield read
+
+
+# ─────────────────────────────────────────────
+#  WRITE QUEUE  (one writer thread, group commits)
+# ─────────────────────────────────────────────
+class DBWriter:
+    """
+    Owns the only write connection for this process. Sessions submit
+    op(cursor, *args) callables and get a Future back; the writer thread
+    drains up to WRITE_BATCH_MAX queued ops into one transaction, so
+    concurrent operators share a commit instead of fighting for the lock.
+    Each op runs inside its own SAVEPOINT — a failing op is rolled back and
+    its Future gets the exception without affecting the rest of the batch.
+    """
+
+    def __init__(self, db_path: str, maxsize: int = WRITE_QUEUE_MAX, batch_max: int = WRITE_BATCH_MAX):
+        self.db_path   = db_path
+        self.batch_max = batch_max
+        self.queue     = queue.Queue(maxsize=maxsize)
+        self.stats     = {"ops": 0, "batches": 0, "errors": 0}
+        self._thread   = threading.Thread(target=self._run, name="rcb-db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op, *args, **kwargs) -> Future:
+        """Queue a write. Blocks when the queue is full (back-pressure)."""
+        fut = Future()
+        self.queue.put((op, args, kwargs, fut))
+        return fut
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_TIMEOUT_S, isolation_level=None)
+        c = conn.cursor()
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_max:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            outcomes = []
+            touched = set()
+            try:
+                c.execute("BEGIN IMMEDIATE")
+                for op, args, kwargs, fut in batch:
+                    c.execute("SAVEPOINT op")
+                    try:
+                        outcomes.append((fut, op(c, *args, **kwargs), None))
+                        c.execute("RELEASE op")
+                        touched.update(getattr(op, "tables", ("*",)))
+                    except Exception as e:
+                        c.execute("ROLLBACK TO op")
+                        c.execute("RELEASE op")
+                        outcomes.append((fut, None, e))
+                with get_table_versions().lock:      # no read sees the commit under old versions
+                    c.execute("COMMIT")
+                    bump_tables(self.db_path, touched)
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                outcomes = [(fut, None, e) for _, _, _, fut in batch]
+
+            self.stats["batches"] += 1
+            for fut, result, err in outcomes:
+                self.stats["ops"] += 1
+                if err is not None:
+                    self.stats["errors"] += 1
+                    fut.set_exception(err)
+                else:
+                    fut.set_result(result)
+
+
+@st.cache_resource
+def get_writer(path: str) -> DBWriter:
+    """One writer per site database, so plants never queue behind each other."""
+    return DBWriter(path)
+
+
+@writes("test_results", "locations")
+def op_record_bag(c, bid, now, operator, prod, loc, status,
+                  weight, hard, moist, tol, ash):
+    """
+    Insert a supersack and claim its slot. If the suggested slot was taken
+    by another session in the meantime, the next free one is used instead.
+    Returns the location actually assigned, or None if the warehouse is full.
+    """
+    if status != "Rejected":
+        c.execute("UPDATE locations SET status='Occupied' WHERE loc_id=? AND status='Available'", (loc,))
+        if c.rowcount != 1:
+            c.execute("SELECT loc_id FROM locations WHERE status='Available' ORDER BY loc_id ASC LIMIT 1")
+            row = c.fetchone()
+            if not row:
+                return None
+            loc = row[0]
+            c.execute("UPDATE locations SET status='Occupied' WHERE loc_id=?", (loc,))
     c.execute(
-        "SELECT loc_id FROM locations WHERE status='Available' ORDER BY loc_id ASC LIMIT 1"
+        """INSERT INTO test_results
+           (bag_ref,timestamp,operator,product,location_id,status,
+            weight_lbs,pellet_hardness,moisture,toluene,ash_content)
+           VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
+        (bid, now, operator, prod, loc, status, weight, hard, moist, tol, ash),
     )
-    res = c.fetchone()
-    conn.close()
-    return res[0] if res else None
+    return loc
+
+
+@writes("test_results", "locations")
+def op_ship_fifo(c, prod, qty, cust, ship_by, ship_date):
+    """Ship the `qty` oldest in-stock bags of `prod`. Returns [(bag_ref, location_id)]."""
+    c.execute(
+        """SELECT bag_ref, location_id FROM test_results
+           WHERE product=? AND status='Inventory'
+           ORDER BY timestamp ASC LIMIT ?""",
+        (prod, int(qty))
+    )
+    picked = c.fetchall()
+    c.executemany(
+        """UPDATE test_results
+           SET status='Shipped', customer_name=?, shipped_date=?, shipped_by=?
+           WHERE bag_ref=?""",
+        [(cust, ship_date, ship_by, bag) for bag, _ in picked],
+    )
+    c.executemany("UPDATE locations SET status='Available' WHERE loc_id=?",
+                  [(loc,) for _, loc in picked])
+    return picked
+
+
+@writes("test_results", "locations")
+def op_ship_bags(c, bag_refs, cust, ship_by, ship_date):
+    """Ship exactly `bag_refs` (a pick list). Returns [(bag_ref, location_id)] for those still in stock."""
+    picked = []
+    for ref in bag_refs:
+        c.execute("SELECT location_id FROM test_results WHERE bag_ref=? AND status='Inventory'", (ref,))
+        row = c.fetchone()
+        if row:
+            picked.append((ref, row[0]))
+    c.executemany(
+        """UPDATE test_results
+           SET status='Shipped', customer_name=?, shipped_date=?, shipped_by=?
+           WHERE bag_ref=?""",
+        [(cust, ship_date, ship_by, bag) for bag, _ in picked],
+    )
+    c.executemany("UPDATE locations SET status='Available' WHERE loc_id=?",
+                  [(loc,) for _, loc in picked])
+    return picked
+
+
+def unique_run_ref(c, run_ref: str, ph: str = "?", match: str = "GLOB", wildcard: str = "*") -> str:
+    """
+    run_ref, or run_ref-2, -3, ... when lines bagging in the same second
+    already took it. Call inside the write transaction that inserts it.
+    """
+    c.execute(f"SELECT COUNT(*) FROM bagging_ops WHERE run_ref = {ph} OR run_ref {match} {ph}",
+              (run_ref, f"{run_ref}-{wildcard}"))
+    taken = c.fetchone()[0]
+    return f"{run_ref}-{taken + 1}" if taken else run_ref
+
+
+@writes("test_results", "bagging_ops", "locations")
+def op_bagging_run(c, now, operator, sack_id, bag_size, qty, pallet, run_ref):
+    """
+    Log a bagging run and consume its supersack. Returns (product, freed
+    location, run_ref as stored), or None if the sack is no longer in
+    inventory. run_ref gets a -2, -3, ... suffix if the second is taken.
+    """
+    c.execute(
+        "SELECT product, location_id FROM test_results WHERE bag_ref=? AND status='Inventory'",
+        (sack_id,)
+    )
+    row = c.fetchone()
+    if not row:
+        return None
+    product, loc_to_free = row
+
+    run_ref = unique_run_ref(c, run_ref)
+    c.execute(
+        """INSERT INTO bagging_ops
+           (timestamp, operator, source_sack_id, product, bag_size_unit, quantity, pallet_id, run_ref)
+           VALUES (?,?,?,?,?,?,?,?)""",
+        (now, operator, sack_id, product, bag_size, int(qty), pallet, run_ref)
+    )
+    c.execute(
+        """UPDATE test_results
+           SET status='Consumed (Bagged)',
+               customer_name='Consumed — Bagged to ' || ?,
+               shipped_date=?,
+               shipped_by=?
+           WHERE bag_ref=?""",
+        (pallet, now.strftime("%Y-%m-%d"), operator, sack_id)
+    )
+    c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (loc_to_free,))
+    return product, loc_to_free, run_ref
+
+
+@writes("test_results", "locations")
+def op_scan_action(c, action: str, bag_ref: str, operator: str, **kw):
+    """
+    Apply a scan-station action to one in-stock supersack.
+    action is 'ship', 'relocate' or 'consume'. Returns (ok, message).
+    """
+    c.execute(
+        "SELECT location_id FROM test_results WHERE bag_ref=? AND status='Inventory'",
+        (bag_ref,)
+    )
+    row = c.fetchone()
+    if not row:
+        return False, f"Bag {bag_ref} is not in inventory — no changes made."
+    old_loc = row[0]
+    today_str = str(date.today())
+
+    if action == "ship":
+        c.execute(
+            """UPDATE test_results
+               SET status='Shipped', customer_name=?, shipped_date=?, shipped_by=?
+               WHERE bag_ref=?""",
+            (kw["customer"], today_str, kw["shipped_by"], bag_ref),
+        )
+        c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (old_loc,))
+        return True, f"Shipped {bag_ref} to {kw['customer']}. Location {old_loc} is now free."
+
+    if action == "relocate":
+        new_loc = kw["new_loc"]
+        c.execute(
+            "UPDATE locations SET status='Occupied' WHERE loc_id=? AND status='Available'",
+            (new_loc,)
+        )
+        if c.rowcount != 1:
+            return False, f"Location {new_loc} is no longer available."
+        c.execute("UPDATE test_results SET location_id=? WHERE bag_ref=?", (new_loc, bag_ref))
+        c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (old_loc,))
+        return True, f"Moved {bag_ref} from {old_loc} to {new_loc}."
+
+    if action == "consume":
+        c.execute(
+            """UPDATE test_results
+               SET status='Consumed (Bagged)',
+                   customer_name='Consumed — Scan Station',
+                   shipped_date=?, shipped_by=?
+               WHERE bag_ref=?""",
+            (today_str, operator, bag_ref),
+        )
+        c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (old_loc,))
+        return True, f"Consumed {bag_ref}. Location {old_loc} is now free."
+
+    return False, f"Unknown action '{action}'."
+
+
+# ─────────────────────────────────────────────
+#  STORAGE BACKENDS  (what the inventory pages read and write through)
+# ─────────────────────────────────────────────
+# Both backends expose the same methods; storage_check.py is the shared
+# conformance + benchmark suite. A snapshot() yields a reader with the
+# read_typed signature minus conn: reader(table, cols, where, params, order,
+# limit, offset), where `where` uses ? placeholders on either backend.
+class DuplicateBagError(Exception):
+    """A bag_ref that already exists was recorded again."""
+
+
+# Location Directory columns: source column -> heading
+LOCATION_VIEW_COLS = {
+    "loc_id": "Location", "status": "Status", "product": "Product", "bag_ref": "Bag ID",
+    "weight_lbs": "Weight (lbs)", "ash_content": "Ash %", "timestamp": "Recorded",
+}
+SACK_COLS = ["bag_ref", "product", "location_id", "status", "timestamp", "weight_lbs",
+             "customer_name", "shipped_date", "shipped_by"]
+
+
+def frame_records(df: pd.DataFrame) -> list:
+    """Rows of a frame as plain dicts, NULLs as None."""
+    return [{k: (None if pd.isna(v) else v) for k, v in row.items()} for row in df.to_dict("records")]
+
+
+def first_row(df: pd.DataFrame):
+    """The first row of a frame as a plain dict (NULLs as None), or None if empty."""
+    return frame_records(df.head(1))[0] if len(df) else None
+
+
+class Storage:
+    """
+    Read views shared by both backends, built only on snapshot() so they
+    behave (and cache) the same everywhere. Subclasses add the writes.
+    """
+
+    cached = True      # False for CLI scripts, which have no browser session
+
+    def _cache(self, cache):
+        if cache is not None:
+            return cache
+        return query_cache() if self.cached else None
+
+    def next_free_slot(self):
+        with self.snapshot() as read:
+            df = read("locations", ["loc_id"], "status='Available'", order="loc_id ASC", limit=1)
+        return df["loc_id"].iat[0] if len(df) else None
+
+    def free_slots(self) -> list:
+        with self.snapshot() as read:
+            df = read("locations", ["loc_id"], "status='Available'", order="loc_id ASC")
+        return list(df["loc_id"])
+
+    def locations_view(self) -> pd.DataFrame:
+        """Every slot with the in-stock bag(s) it holds, headed for the Location Directory."""
+        with self.snapshot() as read:
+            slots = read("locations", ["loc_id", "status"], order="loc_id ASC")
+            bags  = read("test_results", ["location_id", "product", "bag_ref", "weight_lbs", "ash_content",
+                                          "timestamp"], "status='Inventory'")
+        bags["location_id"] = bags["location_id"].astype(object)
+        df = slots.merge(bags, how="left", left_on="loc_id", right_on="location_id")
+        return df[list(LOCATION_VIEW_COLS)].rename(columns=LOCATION_VIEW_COLS)
+
+    def lookup_bag(self, bag_ref: str):
+        """One supersack by bag_ref (UNIQUE index) as a dict, or None."""
+        with self.snapshot() as read:
+            df = read("test_results", SACK_COLS, "bag_ref=?", (bag_ref,))
+        return first_row(df)
+
+    def lookup_run(self, run_ref: str, pallet_id: str):
+        """
+        The bagging run a box label belongs to, as a dict, or None. The
+        label carries both IDs, so a run_ref shared by older same-second
+        runs still resolves on its pallet; runs logged before run_ref was
+        stored fall back to the pallet ID alone.
+        """
+        with self.snapshot() as read:
+            df = read("bagging_ops", BAGGING_RUN_COLS, "run_ref=? AND pallet_id=?", (run_ref, pallet_id),
+                      order="id DESC", limit=1)
+            if df.empty:
+                df = read("bagging_ops", BAGGING_RUN_COLS, "pallet_id=?", (pallet_id,), order="id DESC", limit=1)
+        return first_row(df)
+
+    def pallet_runs(self, pallet_id: str) -> pd.DataFrame:
+        """Every bagging run on a pallet, in the order they were logged."""
+        with self.snapshot() as read:
+            return read("bagging_ops", BAGGING_RUN_COLS, "pallet_id=?", (pallet_id,), order="id ASC")
+
+
+class SQLiteStorage(Storage):
+    """Inventory storage on one site's SQLite file, writing through its DBWriter."""
+
+    def __init__(self, path: str, cached: bool = True):
+        self.path   = path
+        self.cached = cached
+
+    def _write(self, op, *args, **kwargs):
+        return get_writer(self.path).submit(op, *args, **kwargs).result()
+
+    def snapshot(self, cache=None):
+        """Cached reader; cache defaults to the session's QueryCache unless built with cached=False."""
+        return cached_snapshot(self.path, self._snapshot, self._cache(cache))
+
+    @contextmanager
+    def _snapshot(self):
+        with snapshot_conn(self.path) as conn:
+            yield partial(read_typed, conn)
+
+    def record_bag(self, bid, now, operator, prod, loc, status, weight, hard, moist, tol, ash):
+        try:
+            return self._write(op_record_bag, bid, now, operator, prod, loc, status,
+                               weight, hard, moist, tol, ash)
+        except sqlite3.IntegrityError as e:
+            raise DuplicateBagError(bid) from e
+
+    def ship_fifo(self, prod, qty, cust, ship_by, ship_date):
+        return self._write(op_ship_fifo, prod, qty, cust, ship_by, ship_date)
+
+    def ship_bags(self, bag_refs, cust, ship_by, ship_date):
+        return self._write(op_ship_bags, list(bag_refs), cust, ship_by, ship_date)
+
+    def bagging_run(self, now, operator, sack_id, bag_size, qty, pallet, run_ref):
+        return self._write(op_bagging_run, now, operator, sack_id, bag_size, qty, pallet, run_ref)
+
+    def scan_action(self, action: str, bag_ref: str, operator: str, **kw):
+        return self._write(op_scan_action, action, bag_ref, operator, **kw)
+
+
+PG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS test_results (
+        id              BIGSERIAL PRIMARY KEY,
+        bag_ref         TEXT UNIQUE,
+        timestamp       TIMESTAMP,
+        operator        TEXT,
+        product         TEXT,
+        location_id     TEXT,
+        status          TEXT DEFAULT 'Inventory',
+        customer_name   TEXT DEFAULT 'In Inventory',
+        shipped_date    TEXT DEFAULT 'Not Shipped',
+        shipped_by      TEXT DEFAULT 'N/A',
+        weight_lbs      DOUBLE PRECISION,
+        pellet_hardness INTEGER,
+        moisture        DOUBLE PRECISION,
+        toluene         INTEGER,
+        ash_content     DOUBLE PRECISION
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_test_results_fifo ON test_results(product, status, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_test_results_inv_loc ON test_results(location_id) WHERE status='Inventory'",
+    """CREATE TABLE IF NOT EXISTS bagging_ops (
+        id              BIGSERIAL PRIMARY KEY,
+        timestamp       TIMESTAMP,
+        operator        TEXT,
+        source_sack_id  TEXT,
+        product         TEXT,
+        bag_size_unit   TEXT,
+        quantity        INTEGER,
+        pallet_id       TEXT,
+        run_ref         TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_bagging_ops_run_ref ON bagging_ops(run_ref)",
+    "CREATE INDEX IF NOT EXISTS idx_bagging_ops_pallet ON bagging_ops(pallet_id)",
+    """CREATE TABLE IF NOT EXISTS small_bags (
+        id              BIGSERIAL PRIMARY KEY,
+        bag_ref         TEXT UNIQUE,
+        timestamp       TIMESTAMP,
+        operator        TEXT,
+        product         TEXT,
+        bag_size_unit   TEXT,
+        source_sack_id  TEXT,
+        pallet_id       TEXT,
+        status          TEXT DEFAULT 'Inventory',
+        customer_name   TEXT DEFAULT 'In Inventory',
+        shipped_date    TEXT DEFAULT 'Not Shipped',
+        shipped_by      TEXT DEFAULT 'N/A'
+    )""",
+    """CREATE TABLE IF NOT EXISTS locations (
+        loc_id TEXT PRIMARY KEY,
+        status TEXT DEFAULT 'Available'
+    )""",
+]
+
+
+class PostgresStorage(Storage):
+    """
+    Inventory storage on PostgreSQL with a thread-safe connection pool.
+    There is no writer thread: sessions write concurrently and row locks
+    (FOR UPDATE SKIP LOCKED) keep two sessions off the same slot or bag.
+    """
+
+    def __init__(self, dsn: str, minconn: int = PG_POOL_MIN, maxconn: int = PG_POOL_MAX,
+                 cached: bool = True):
+        if psycopg2 is None:
+            raise RuntimeError("STORAGE_BACKEND='postgres' needs psycopg2 (pip install psycopg2-binary)")
+        self.dsn    = dsn
+        self.cached = cached
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        with self._tx() as cur:
+            for ddl in PG_SCHEMA:
+                cur.execute(ddl)
+            cur.execute("SELECT COUNT(*) FROM locations")
+            if cur.fetchone()[0] == 0:
+                self._seed_slots(cur, 100)
+
+    @staticmethod
+    def _seed_slots(cur, slots: int):
+        cur.execute(
+            "INSERT INTO locations SELECT 'WH-' || lpad(i::text, 3, '0'), 'Available' FROM generate_series(1, %s) i",
+            (slots,),
+        )
+
+    @contextmanager
+    def _tx(self, tables=()):
+        """A pooled connection in one read-committed transaction that writes `tables`."""
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = False
+            with conn.cursor() as cur:
+                yield cur
+            with get_table_versions().lock:          # no read sees the commit under old versions
+                conn.commit()
+                if tables:
+                    bump_tables(self.dsn, tables)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def snapshot(self, cache=None):
+        """Cached reader; cache defaults to the session's QueryCache unless built with cached=False."""
+        return cached_snapshot(self.dsn, self._snapshot, self._cache(cache))
+
+    @contextmanager
+    def _snapshot(self):
+        conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY")
+                cur.execute("SELECT 1")                 # the first query fixes the snapshot
+
+                def read(table, cols, where="", params=(), order="", limit=None, offset=0):
+                    cur.execute(select_sql(table, cols, where.replace("?", "%s"), order, limit, offset), params)
+                    names = [d[0] for d in cur.description]
+                    return compact_frame(pd.DataFrame(cur.fetchall(), columns=names))
+
+                try:
+                    yield read
+                finally:
+                    cur.execute("ROLLBACK")
+        finally:
+            self.pool.putconn(conn)
+
+    def record_bag(self, bid, now, operator, prod, loc, status, weight, hard, moist, tol, ash):
+        try:
+            with self._tx(op_record_bag.tables) as cur:
+                if status != "Rejected":
+                    # The suggested slot if it is still free, else the next free one
+                    cur.execute(
+                        """UPDATE locations SET status='Occupied'
+                           WHERE loc_id = COALESCE(
+                               (SELECT loc_id FROM locations WHERE loc_id=%s AND status='Available'
+                                FOR UPDATE SKIP LOCKED),
+                               (SELECT loc_id FROM locations WHERE status='Available'
+                                ORDER BY loc_id LIMIT 1 FOR UPDATE SKIP LOCKED))
+                           RETURNING loc_id""",
+                        (loc,),
+                    )
+                    row = cur.fetchone()
+                    if not row:
+                        return None
+                    loc = row[0]
+                cur.execute(
+                    """INSERT INTO test_results
+                       (bag_ref,timestamp,operator,product,location_id,status,
+                        weight_lbs,pellet_hardness,moisture,toluene,ash_content)
+                       VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)""",
+                    (bid, now, operator, prod, loc, status, weight, hard, moist, tol, ash),
+                )
+            return loc
+        except psycopg2.IntegrityError as e:
+            raise DuplicateBagError(bid) from e
+
+    def ship_fifo(self, prod, qty, cust, ship_by, ship_date):
+        with self._tx(op_ship_fifo.tables) as cur:
+            cur.execute(
+                """WITH picked AS (
+                       SELECT id, bag_ref, location_id, timestamp FROM test_results
+                       WHERE product=%s AND status='Inventory'
+                       ORDER BY timestamp ASC LIMIT %s
+                       FOR UPDATE SKIP LOCKED)
+                   UPDATE test_results t
+                   SET status='Shipped', customer_name=%s, shipped_date=%s, shipped_by=%s
+                   FROM picked WHERE t.id = picked.id
+                   RETURNING picked.timestamp, picked.bag_ref, picked.location_id""",
+                (prod, int(qty), cust, ship_date, ship_by),
+            )
+            picked = [(bag, loc) for _, bag, loc in sorted(cur.fetchall())]
+            cur.execute("UPDATE locations SET status='Available' WHERE loc_id = ANY(%s)",
+                        ([loc for _, loc in picked],))
+        return picked
+
+    def ship_bags(self, bag_refs, cust, ship_by, ship_date):
+        bag_refs = list(bag_refs)
+        with self._tx(op_ship_bags.tables) as cur:
+            cur.execute(
+                """UPDATE test_results
+                   SET status='Shipped', customer_name=%s, shipped_date=%s, shipped_by=%s
+                   WHERE bag_ref = ANY(%s) AND status='Inventory'
+                   RETURNING bag_ref, location_id""",
+                (cust, ship_date, ship_by, bag_refs),
+            )
+            found = dict(cur.fetchall())
+            cur.execute("UPDATE locations SET status='Available' WHERE loc_id = ANY(%s)",
+                        (list(found.values()),))
+        return [(ref, found[ref]) for ref in bag_refs if ref in found]
+
+    def bagging_run(self, now, operator, sack_id, bag_size, qty, pallet, run_ref):
+        with self._tx(op_bagging_run.tables) as cur:
+            cur.execute(
+                """UPDATE test_results
+                   SET status='Consumed (Bagged)',
+                       customer_name='Consumed — Bagged to ' || %s,
+                       shipped_date=%s,
+                       shipped_by=%s
+                   WHERE bag_ref=%s AND status='Inventory'
+                   RETURNING product, location_id""",
+                (pallet, now.strftime("%Y-%m-%d"), operator, sack_id),
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+            product, loc_to_free = row
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (run_ref,))   # same-second runs take suffixes in turn
+            run_ref = unique_run_ref(cur, run_ref, "%s", "LIKE", "%")
+            cur.execute(
+                """INSERT INTO bagging_ops
+                   (timestamp, operator, source_sack_id, product, bag_size_unit, quantity, pallet_id, run_ref)
+                   VALUES (%s,%s,%s,%s,%s,%s,%s,%s)""",
+                (now, operator, sack_id, product, bag_size, int(qty), pallet, run_ref),
+            )
+            cur.execute("UPDATE locations SET status='Available' WHERE loc_id=%s", (loc_to_free,))
+        return product, loc_to_free, run_ref
+
+    def scan_action(self, action: str, bag_ref: str, operator: str, **kw):
+        """Same contract as op_scan_action; the bag row is locked for the transaction."""
+        with self._tx(op_scan_action.tables) as cur:
+            cur.execute("SELECT location_id FROM test_results WHERE bag_ref=%s AND status='Inventory' FOR UPDATE",
+                        (bag_ref,))
+            row = cur.fetchone()
+            if not row:
+                return False, f"Bag {bag_ref} is not in inventory — no changes made."
+            old_loc = row[0]
+            today_str = str(date.today())
+
+            if action == "ship":
+                cur.execute(
+                    """UPDATE test_results
+                       SET status='Shipped', customer_name=%s, shipped_date=%s, shipped_by=%s
+                       WHERE bag_ref=%s""",
+                    (kw["customer"], today_str, kw["shipped_by"], bag_ref),
+                )
+                cur.execute("UPDATE locations SET status='Available' WHERE loc_id=%s", (old_loc,))
+                return True, f"Shipped {bag_ref} to {kw['customer']}. Location {old_loc} is now free."
+
+            if action == "relocate":
+                new_loc = kw["new_loc"]
+                cur.execute("UPDATE locations SET status='Occupied' WHERE loc_id=%s AND status='Available'",
+                            (new_loc,))
+                if cur.rowcount != 1:
+                    return False, f"Location {new_loc} is no longer available."
+                cur.execute("UPDATE test_results SET location_id=%s WHERE bag_ref=%s", (new_loc, bag_ref))
+                cur.execute("UPDATE locations SET status='Available' WHERE loc_id=%s", (old_loc,))
+                return True, f"Moved {bag_ref} from {old_loc} to {new_loc}."
+
+            if action == "consume":
+                cur.execute(
+                    """UPDATE test_results
+                       SET status='Consumed (Bagged)',
+                           customer_name='Consumed — Scan Station',
+                           shipped_date=%s, shipped_by=%s
+                       WHERE bag_ref=%s""",
+                    (today_str, operator, bag_ref),
+                )
+                cur.execute("UPDATE locations SET status='Available' WHERE loc_id=%s", (old_loc,))
+                return True, f"Consumed {bag_ref}. Location {old_loc} is now free."
+
+        return False, f"Unknown action '{action}'."
+
+
+@st.cache_resource
+def get_postgres_storage(dsn: str) -> PostgresStorage:
+    return PostgresStorage(dsn)
+
+
+def get_storage(site: str = None):
+    """Storage backend for `site` (default: this session's site)."""
+    if STORAGE_BACKEND == "postgres":
+        site = site or st.session_state.get("site") or next(iter(sites()))
+        return get_postgres_storage(POSTGRES_DSN.format(site=site.lower().replace(" ", "_")))
+    return SQLiteStorage(site_db(site))
+
+
+# ─────────────────────────────────────────────
+#  INVENTORY CONSISTENCY  (locations vs in-stock supersacks)
+# ─────────────────────────────────────────────
+# name -> (description, query returning the offending rows, repairable)
+INVENTORY_CHECKS = {
+    "occupied_without_bag": (
+        "Slot marked Occupied with no in-stock bag",
+        """SELECT l.loc_id FROM locations l
+           WHERE l.status = 'Occupied'
+             AND NOT EXISTS (SELECT 1 FROM test_results t
+                             WHERE t.location_id = l.loc_id AND t.status = 'Inventory')""",
+        True,
+    ),
+    "available_with_bag": (
+        "Slot marked Available but holding an in-stock bag",
+        """SELECT l.loc_id FROM locations l
+           WHERE l.status = 'Available'
+             AND EXISTS (SELECT 1 FROM test_results t
+                         WHERE t.location_id = l.loc_id AND t.status = 'Inventory')""",
+        True,
+    ),
+    "double_booked": (
+        "Slot holding more than one in-stock bag (needs a physical check)",
+        """SELECT location_id, COUNT(*) AS bags, GROUP_CONCAT(bag_ref, ', ') AS bag_refs
+           FROM test_results WHERE status = 'Inventory'
+           GROUP BY location_id HAVING COUNT(*) > 1""",
+        False,
+    ),
+    "unknown_location": (
+        "In-stock bag whose location is not a warehouse slot (needs a physical check)",
+        """SELECT t.bag_ref, t.location_id FROM test_results t
+           WHERE t.status = 'Inventory'
+             AND NOT EXISTS (SELECT 1 FROM locations l WHERE l.loc_id = t.location_id)""",
+        False,
+    ),
+}
+
+
+def find_inventory_mismatches(conn, sample: int = 20) -> dict:
+    """Run every INVENTORY_CHECKS query. Returns name -> (count, sample DataFrame)."""
+    out = {}
+    for name, (_, sql, _) in INVENTORY_CHECKS.items():
+        count = conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+        rows  = pd.read_sql_query(f"{sql} LIMIT {int(sample)}", conn) if count else pd.DataFrame()
+        out[name] = (count, rows)
+    return out
+
+
+@writes("locations")
+def op_repair_slot_status(c):
+    """
+    Make locations.status agree with test_results in two set-based UPDATEs.
+    Double-booked slots and unknown locations are left for a human.
+    Returns the number of slots changed.
+    """
+    c.execute(
+        """UPDATE locations SET status = 'Occupied'
+           WHERE status != 'Occupied'
+             AND EXISTS (SELECT 1 FROM test_results t
+                         WHERE t.location_id = locations.loc_id AND t.status = 'Inventory')"""
+    )
+    fixed = c.rowcount
+    c.execute(
+        """UPDATE locations SET status = 'Available'
+           WHERE status != 'Available'
+             AND NOT EXISTS (SELECT 1 FROM test_results t
+                             WHERE t.location_id = locations.loc_id AND t.status = 'Inventory')"""
+    )
+    return fixed + c.rowcount
+
+
+# ─────────────────────────────────────────────
+#  REACTOR TELEMETRY  (process_logs ingestion + rollups)
+# ─────────────────────────────────────────────
+TS_FMT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+@writes("process_logs", "process_logs_1m", "process_logs_1h")
+def op_ingest_process_logs(c, rows):
+    """
+    Insert a batch of raw readings, then rebuild only the 1-minute and
+    1-hour rollup buckets the batch touched. rows are
+    (timestamp, operator, *PROCESS_CHANNELS) tuples with text timestamps.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    cols = ", ".join(PROCESS_CHANNELS)
+    marks = ", ".join("?" for _ in PROCESS_CHANNELS)
+    c.executemany(
+        f"INSERT INTO process_logs (timestamp, operator, {cols}) VALUES (?, ?, {marks})",
+        rows,
+    )
+
+    stamps = [r[0] for r in rows]
+    rollup_process_logs(c, min(stamps), max(stamps))
+    return len(rows)
+
+
+ROLLUP_COLS = ", ".join(
+    ["bucket", "n"] + [f"{ch}_{agg}" for ch in PROCESS_CHANNELS for agg in ("avg", "min", "max", "n")]
+)
+
+
+def rollup_process_logs(c, first: str, last: str):
+    """Rebuild the 1-minute and 1-hour rollup buckets covering timestamps first..last."""
+    # Minute buckets straight from the raw samples (index range scan)
+    aggs = ", ".join(f"AVG({ch}), MIN({ch}), MAX({ch}), COUNT({ch})" for ch in PROCESS_CHANNELS)
+    c.execute(
+        f"""INSERT OR REPLACE INTO process_logs_1m ({ROLLUP_COLS})
+            SELECT substr(timestamp, 1, 16), COUNT(*), {aggs}
+            FROM process_logs
+            WHERE timestamp >= ? AND timestamp <= ?
+            GROUP BY 1""",
+        (first[:16], last[:16] + ":99"),
+    )
+
+    # Hour buckets from the minute rollups, each channel weighted by its own sample count
+    aggs = ", ".join(
+        f"SUM({ch}_avg * {ch}_n) / SUM({ch}_n), MIN({ch}_min), MAX({ch}_max), SUM({ch}_n)"
+        for ch in PROCESS_CHANNELS
+    )
+    c.execute(
+        f"""INSERT OR REPLACE INTO process_logs_1h ({ROLLUP_COLS})
+            SELECT substr(bucket, 1, 13), SUM(n), {aggs}
+            FROM process_logs_1m
+            WHERE bucket >= ? AND bucket <= ?
+            GROUP BY 1""",
+        (first[:13], last[:13] + ":99"),
+    )
+
+
+def backfill_rollups(c):
+    """
+    Roll up raw samples that lie outside the existing minute buckets — logs
+    from before the rollup tables existed, or history imported around the
+    live feed. All four ends are index lookups, so once caught up this is
+    a cheap check on every startup.
+    """
+    raw_first, raw_last = c.execute("SELECT MIN(timestamp), MAX(timestamp) FROM process_logs").fetchone()
+    if raw_first is None:
+        return
+    first, last = c.execute("SELECT MIN(bucket), MAX(bucket) FROM process_logs_1m").fetchone()
+    if first is None:
+        rollup_process_logs(c, raw_first, raw_last)
+        return
+    if raw_first[:16] < first:
+        rollup_process_logs(c, raw_first, first)
+    if raw_last[:16] > last:
+        rollup_process_logs(c, last, raw_last)
+
+
+def ingest_process_readings(readings, operator: str = "PLC", path: str = None):
+    """
+    Public ingestion entry point for the PLC feed. readings is a list of
+    dicts with 'timestamp' (datetime or text) and one key per channel;
+    path is the site database (default: this session's site, else DB_PATH).
+    Returns a Future resolving to the number of rows written, so a
+    high-rate feeder can keep sampling while the batch commits.
+    """
+    rows = []
+    for r in readings:
+        ts = r["timestamp"]
+        if isinstance(ts, datetime):
+            ts = ts.strftime(TS_FMT)
+        rows.append((ts, r.get("operator", operator), *(r.get(ch) for ch in PROCESS_CHANNELS)))
+    return get_writer(path or site_db()).submit(op_ingest_process_logs, rows)
+
+
+# ─────────────────────────────────────────────
+#  REPORT SCHEDULER  (incremental shift / customer / bagging reports)
+# ─────────────────────────────────────────────
+# Triggers mark (report, period) rows in rpt_dirty whenever source data
+# changes; the background scheduler recomputes only those periods into the
+# rpt_* tables, which the Reports page reads directly. gen is bumped on
+# every re-mark so a period dirtied mid-refresh is not cleared by it.
+def shift_sql(col: str) -> str:
+    """
+    SQL for the start ('YYYY-MM-DD HH:MM:SS') of the shift containing text
+    timestamp `col`. Fractional seconds are cut off first: SQLite's date
+    functions round to the millisecond, which would put 17:59:59.9999 in the
+    18:00 shift while the report join (a text comparison) keeps it in 06:00.
+    """
+    offset, span = SHIFT_START_HOUR * 3600, SHIFT_HOURS * 3600
+    return (f"datetime((CAST(strftime('%s', substr({col}, 1, 19)) AS INTEGER) - {offset}) / {span} * {span} "
+            f"+ {offset}, 'unixepoch')")
+
+
+def day_sql(col: str) -> str:
+    """SQL for the 'YYYY-MM-DD' day of text timestamp `col`, truncated like shift_sql."""
+    return f"date(substr({col}, 1, 19))"
+
+
+def bag_lbs_sql(col: str) -> str:
+    """SQL for the weight in lbs of one small bag of size `col` (0 for unknown sizes)."""
+    whens = " ".join(f"WHEN '{size}' THEN {kg * 2.20462:.4f}" for size, kg in BAG_SIZE_KG.items())
+    return f"(CASE {col} {whens} ELSE 0 END)"
+
+
+REPORT_TABLES = {
+    "shift": ("rpt_shift", "shift_start", """
+        shift_start TEXT, product TEXT, bags INTEGER, weight_lbs REAL, rejected INTEGER,
+        PRIMARY KEY (shift_start, product)"""),
+    "customer": ("rpt_customer", "shipped_date", """
+        shipped_date TEXT, customer_name TEXT, product TEXT,
+        supersacks INTEGER, small_bags INTEGER, weight_lbs REAL,
+        PRIMARY KEY (shipped_date, customer_name, product)"""),
+    "bagging": ("rpt_bagging", "day", """
+        day TEXT, product TEXT, runs INTEGER, bags INTEGER, input_lbs REAL, output_lbs REAL,
+        PRIMARY KEY (day, product)"""),
+}
+
+
+def report_queries() -> dict:
+    """report -> SELECT producing its rows for every dirty period (run in one snapshot)."""
+    shift_end = f"datetime(d.period, '+{SHIFT_HOURS} hours')"
+    return {
+        "shift": f"""
+            SELECT d.period, t.product, COUNT(*), SUM(t.weight_lbs),
+                   SUM(t.status = 'Rejected')
+            FROM rpt_dirty d
+            JOIN test_results t ON t.timestamp >= d.period AND t.timestamp < {shift_end}
+            WHERE d.report = 'shift'
+            GROUP BY 1, 2""",
+        "customer": f"""
+            SELECT shipped_date, customer_name, product, SUM(sacks), SUM(small), SUM(lbs)
+            FROM (
+                SELECT shipped_date, customer_name, product, 1 AS sacks, 0 AS small, weight_lbs AS lbs
+                FROM test_results
+                WHERE status = 'Shipped'
+                  AND shipped_date IN (SELECT period FROM rpt_dirty WHERE report = 'customer')
+                UNION ALL
+                SELECT shipped_date, customer_name, product, 0, 1, {bag_lbs_sql("bag_size_unit")}
+                FROM small_bags
+                WHERE status = 'Shipped'
+                  AND shipped_date IN (SELECT period FROM rpt_dirty WHERE report = 'customer')
+            )
+            GROUP BY 1, 2, 3""",
+        "bagging": f"""
+            SELECT d.period, b.product, COUNT(*), SUM(b.quantity),
+                   SUM(s.weight_lbs), SUM(b.quantity * {bag_lbs_sql("b.bag_size_unit")})
+            FROM rpt_dirty d
+            JOIN bagging_ops b ON b.timestamp >= d.period AND b.timestamp < date(d.period, '+1 day')
+            LEFT JOIN test_results s ON s.bag_ref = b.source_sack_id
+            WHERE d.report = 'bagging'
+            GROUP BY 1, 2""",
+    }
+
+
+def mark_all_report_periods(c):
+    """Mark every period that has source data dirty, so the next refresh rebuilds every report."""
+    c.execute(f"INSERT OR IGNORE INTO rpt_dirty (report, period) "
+              f"SELECT DISTINCT 'shift', {shift_sql('timestamp')} FROM test_results WHERE timestamp IS NOT NULL")
+    c.execute("INSERT OR IGNORE INTO rpt_dirty (report, period) "
+              "SELECT DISTINCT 'customer', shipped_date FROM test_results "
+              "WHERE status='Shipped' AND shipped_date IS NOT NULL "
+              "UNION SELECT DISTINCT 'customer', shipped_date FROM small_bags "
+              "WHERE status='Shipped' AND shipped_date IS NOT NULL")
+    c.execute(f"INSERT OR IGNORE INTO rpt_dirty (report, period) "
+              f"SELECT DISTINCT 'bagging', {day_sql('timestamp')} FROM bagging_ops WHERE timestamp IS NOT NULL")
+
+
+def init_reports(c):
+    """
+    Report tables and dirty-period triggers. The triggers are re-created
+    whenever their definition changes; the first time, and after such a
+    change, every period is marked so the reports rebuild in full.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE name='rpt_dirty'")
+    rebuild = c.fetchone() is None
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS rpt_dirty (
+            report TEXT,
+            period TEXT,
+            gen    INTEGER DEFAULT 1,
+            PRIMARY KEY (report, period)
+        )
+    """)
+    for table, _, cols in REPORT_TABLES.values():
+        c.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols})")
+
+    # A row without a timestamp / shipped_date belongs to no period: never mark NULL
+    def mark(report, period, when="1"):
+        return (f"INSERT INTO rpt_dirty (report, period) SELECT '{report}', {period} "
+                f"WHERE {when} AND {period} IS NOT NULL "
+                f"ON CONFLICT (report, period) DO UPDATE SET gen = gen + 1;")
+
+    # table -> (columns the reports read, marks); UPDATE triggers mark both the old and new period
+    marks = {
+        "test_results": ("timestamp, product, status, weight_lbs, customer_name, shipped_date", [
+            mark("shift", shift_sql("{r}.timestamp")),
+            mark("customer", "{r}.shipped_date", "{r}.status = 'Shipped'"),
+        ]),
+        "small_bags": ("product, status, bag_size_unit, customer_name, shipped_date", [
+            mark("customer", "{r}.shipped_date", "{r}.status = 'Shipped'"),
+        ]),
+        "bagging_ops": ("timestamp, product, quantity, bag_size_unit, source_sack_id", [
+            mark("bagging", day_sql("{r}.timestamp")),
+        ]),
+    }
+    for table, (watched, stmts) in marks.items():
+        events = (("INSERT", "INSERT", ["new"]), ("UPDATE", f"UPDATE OF {watched}", ["old", "new"]),
+                  ("DELETE", "DELETE", ["old"]))
+        for name, event, rows in events:
+            trigger = f"{table}_rpt_{name.lower()}"
+            body = "\n".join(stmt.format(r=r) for r in rows for stmt in stmts)
+            sql = f"CREATE TRIGGER {trigger} AFTER {event} ON {table} BEGIN\n{body}\nEND"
+            c.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name=?", (trigger,))
+            current = c.fetchone()
+            if current is None or current[0] != sql:
+                c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+                c.execute(sql)
+                rebuild = True
+
+    if rebuild:
+        # Older triggers could leave NULL periods behind, or mark the wrong shift
+        c.execute("DELETE FROM rpt_dirty WHERE period IS NULL")
+        mark_all_report_periods(c)
+
+
+@writes("rpt_shift", "rpt_customer", "rpt_bagging", "rpt_dirty")
+def op_store_reports(c, dirty, results):
+    """Replace the rows of every refreshed period, then clear the dirty marks that are still current."""
+    for report, (table, period_col, _) in REPORT_TABLES.items():
+        periods = [(period,) for rep_name, period, _ in dirty if rep_name == report]
+        c.executemany(f"DELETE FROM {table} WHERE {period_col} = ?", periods)
+        rows = results[report]
+        if rows:
+            marks = ", ".join("?" for _ in rows[0])
+            c.executemany(f"INSERT INTO {table} VALUES ({marks})", rows)
+    c.executemany("DELETE FROM rpt_dirty WHERE report = ? AND period = ? AND gen = ?", dirty)
+    return len(dirty)
+
+
+def refresh_reports(path: str = None) -> int:
+    """
+    Recompute every dirty report period from one read snapshot, off the
+    writer thread, then hand the results to the writer. Returns the number
+    of periods refreshed.
+    """
+    path = path or site_db()
+    with snapshot_conn(path) as conn:
+        dirty = conn.execute("SELECT report, period, gen FROM rpt_dirty").fetchall()
+        if not dirty:
+            return 0
+        results = {name: conn.execute(sql).fetchall() for name, sql in report_queries().items()}
+    return get_writer(path).submit(op_store_reports, dirty, results).result()
+
+
+class ReportScheduler:
+    """
+    Background thread that keeps one site's rpt_* tables current. It refreshes
+    every `interval_s` seconds, or straight away when request() is called.
+    """
+
+    def __init__(self, path: str, interval_s: float = REPORT_INTERVAL_S):
+        self.path       = path
+        self.interval_s = interval_s
+        self.stats      = {"runs": 0, "periods": 0, "errors": 0, "last_run": None,
+                           "last_s": 0.0, "last_error": ""}
+        self._wake      = threading.Event()
+        self._lock      = threading.Lock()
+        self._waiting   = []       # Events of request() calls the next run answers
+        self._thread    = threading.Thread(target=self._run, name="rcb-report-scheduler", daemon=True)
+        self._thread.start()
+
+    def request(self) -> threading.Event:
+        """
+        Ask for a refresh now instead of at the next interval. The returned
+        Event is set once a refresh that started after this call has finished.
+        """
+        done = threading.Event()
+        with self._lock:
+            self._waiting.append(done)
+        self._wake.set()
+        return done
+
+    def _run(self):
+        while True:
+            with self._lock:
+                answering, self._waiting = self._waiting, []
+            t0 = time.perf_counter()
+            try:
+                self.stats["periods"] += refresh_reports(self.path)
+                self.stats["runs"]    += 1
+            except Exception as e:
+                self.stats["errors"]    += 1
+                self.stats["last_error"] = str(e)
+            self.stats["last_run"] = datetime.now()
+            self.stats["last_s"]   = time.perf_counter() - t0
+            for done in answering:
+                done.set()
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+
+
+@st.cache_resource
+def get_report_scheduler(path: str) -> ReportScheduler:
+    return ReportScheduler(path)
 
 
 # ─────────────────────────────────────────────
@@ -251,14 +1823,18 @@ def render_label(ls: dict):
 # ─────────────────────────────────────────────
 #  BOX / PALLET LABEL
 # ─────────────────────────────────────────────
+def box_qr_payload(info: dict) -> str:
+    """QR content for box labels — parse_scan() splits this back apart."""
+    return f"{info['run_ref']} | {info['product']} | {info['bag_size_unit']} x {info['qty']} | {info['pallet_id']}"
+
+
 def render_box_label(info: dict, copy_num: int = 1, total_copies: int = 1):
     """
     Render a single box/pallet/gaylord label.
     info keys: product, bag_size_unit, qty, total_weight_str,
                pallet_id, source_sack_id, operator, date_str, run_ref
     """
-    qr_data = f"{info['run_ref']} | {info['product']} | {info['bag_size_unit']} x {info['qty']} | {info['pallet_id']}"
-    qr_b64  = generate_qr_b64(qr_data)
+    qr_b64  = generate_qr_b64(box_qr_payload(info))
 
     copy_line = f"Copy {copy_num} of {total_copies}" if total_copies > 1 else ""
 
@@ -352,23 +1928,250 @@ def render_box_label(info: dict, copy_num: int = 1, total_copies: int = 1):
     st.components.v1.html(html, height=720, scrolling=False)
 
 
+# ─────────────────────────────────────────────
+#  THERMAL PRINTING  (ZPL over raw TCP 9100)
+# ─────────────────────────────────────────────
+def zpl_text(s) -> str:
+    """Escape a value for a ^FH^FD field (^, ~ and _ are ZPL control characters)."""
+    return str(s).replace("_", "_5F").replace("^", "_5E").replace("~", "_7E")
+
+
+def zpl_field(x: int, y: int, text, size: int = 30) -> str:
+    return f"^FO{x},{y}^A0N,{size},{size}^FH^FD{zpl_text(text)}^FS"
+
+
+def zpl_bag_label(ls: dict) -> str:
+    """ZPL for the supersack label — same layout as render_label, 4x6 in @ 203 dpi."""
+    rejected = ls.get("rejected", False)
+    y = 40
+    z = ["^XA^CI28", f"^PW{LABEL_WIDTH_DOTS}^LL{LABEL_HEIGHT_DOTS}",
+         f"^FO20,20^GB{LABEL_WIDTH_DOTS - 40},{LABEL_HEIGHT_DOTS - 40},{12 if rejected else 8}^FS",
+         f"^FO40,{y}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,80,80^FH^FD{zpl_text(ls['prod'])}^FS"]
+    y += 110
+    if rejected:
+        z.append(f"^FO40,{y}^GB{LABEL_WIDTH_DOTS - 80},110,110^FS")
+        z.append(f"^FO40,{y + 15}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,80,80^FR^FDREJECTED^FS")
+        y += 130
+        for reason in ls.get("reject_reasons", []):
+            z.append(zpl_field(60, y, reason, 26))
+            y += 34
+    z.append(f"^FO{LABEL_WIDTH_DOTS // 2 - 150},{y}^BQN,2,8^FH^FDLA,{zpl_text(ls['id'])}^FS")
+    y += 330
+    z.append(f"^FO40,{y}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,40,40^FH^FD{zpl_text(ls['id'])}^FS")
+    y += 70
+    for line in [
+        f"Location: {ls['loc']}",
+        f"Weight: {ls['weight']:.1f} lbs",
+        f"Ash: {ls['ash']:.2f}%  |  Hardness: {int(ls['hard'])}",
+        f"Moisture: {ls['moist']:.2f}%  |  Toluene: {ls['tol']}",
+        f"Operator: {ls['operator']}",
+        f"Date/Time: {ls.get('ts', '')}",
+    ]:
+        z.append(zpl_field(60, y, line, 36))
+        y += 50
+    footer = "REJECTED - DO NOT SHIP" if rejected else "Revolution Carbon Black - Pyrolysis Facility"
+    z.append(f"^FO40,{LABEL_HEIGHT_DOTS - 80}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,26,26^FH^FD{zpl_text(footer)}^FS")
+    z.append("^XZ")
+    return "\n".join(z)
+
+
+def zpl_box_label(info: dict, copy_num: int = 1, total_copies: int = 1) -> str:
+    """ZPL for the box / pallet label — same layout and QR payload as render_box_label."""
+    y = 40
+    z = ["^XA^CI28", f"^PW{LABEL_WIDTH_DOTS}^LL{LABEL_HEIGHT_DOTS}",
+         f"^FO20,20^GB{LABEL_WIDTH_DOTS - 40},{LABEL_HEIGHT_DOTS - 40},10^FS",
+         f"^FO40,{y}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,80,80^FH^FD{zpl_text(str(info['product']).upper())}^FS"]
+    y += 120
+    col_w = (LABEL_WIDTH_DOTS - 80) // 3
+    for i, (label, value) in enumerate([
+        ("BAG SIZE", info["bag_size_unit"]),
+        ("NO. OF BAGS", info["qty"]),
+        ("TOTAL WEIGHT", info["total_weight_str"]),
+    ]):
+        x = 40 + i * col_w
+        z.append(f"^FO{x},{y}^FB{col_w},1,0,C^A0N,24,24^FH^FD{zpl_text(label)}^FS")
+        z.append(f"^FO{x},{y + 34}^FB{col_w},2,0,C^A0N,44,44^FH^FD{zpl_text(value)}^FS")
+    y += 140
+    z.append(f"^FO{LABEL_WIDTH_DOTS // 2 - 140},{y}^BQN,2,7^FH^FDLA,{zpl_text(box_qr_payload(info))}^FS")
+    y += 320
+    z.append(f"^FO40,{y}^FB{LABEL_WIDTH_DOTS - 80},1,0,C^A0N,28,28^FH^FD{zpl_text(info['run_ref'])}^FS")
+    y += 60
+    z.append(f"^FO40,{y}^GB{LABEL_WIDTH_DOTS - 80},6,6^FS")
+    y += 30
+    for line in [
+        f"Pallet / Box ID: {info['pallet_id']}",
+        f"Source Sack: {info['source_sack_id']}",
+        f"Date: {info['date_str']}   Operator: {info['operator']}",
+    ]:
+        z.append(zpl_field(60, y, line, 38))
+        y += 56
+    z.append(zpl_field(40, LABEL_HEIGHT_DOTS - 80, "Revolution Carbon Black - Pyrolysis Facility", 24))
+    if total_copies > 1:
+        z.append(zpl_field(LABEL_WIDTH_DOTS - 240, LABEL_HEIGHT_DOTS - 80, f"Copy {copy_num} of {total_copies}", 24))
+    z.append("^XZ")
+    return "\n".join(z)
+
+
+class LabelSpooler:
+    """
+    Background print spooler for a raw-TCP (port 9100) label printer.
+    Jobs are lists of ZPL labels; whatever is queued when the printer
+    connection opens is sent in one stream, so a pallet of labels costs
+    one round trip instead of one browser print dialog per label.
+    """
+
+    def __init__(self, host: str, port: int, batch_max: int = PRINT_BATCH_MAX):
+        self.host      = host
+        self.port      = port
+        self.batch_max = batch_max
+        self.queue     = queue.Queue()
+        self.stats     = {"jobs": 0, "labels": 0, "bytes": 0, "errors": 0, "cancelled": 0, "send_s": 0.0}
+        self._thread   = threading.Thread(target=self._run, name="rcb-label-spooler", daemon=True)
+        self._thread.start()
+
+    def submit(self, labels: list) -> Future:
+        """
+        Queue ZPL labels. The Future resolves to {'labels', 'bytes', 'seconds'}
+        for this job alone. fut.cancel() succeeds only until the printer
+        connection is open; after that the job is committed to the printer.
+        """
+        fut = Future()
+        self.queue.put((labels, fut))
+        return fut
+
+    def labels_per_second(self) -> float:
+        return self.stats["labels"] / self.stats["send_s"] if self.stats["send_s"] else 0.0
+
+    def _run(self):
+        while True:
+            jobs = [self.queue.get()]
+            n_labels = len(jobs[0][0])
+            while n_labels < self.batch_max:
+                try:
+                    job = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                n_labels += len(job[0])
+
+            t0 = time.perf_counter()
+            try:
+                with socket.create_connection((self.host, self.port), timeout=PRINTER_TIMEOUT_S) as sock:
+                    # Jobs whose caller gave up while we were connecting are dropped
+                    # here; the rest can no longer be cancelled, so their callers
+                    # know they may print.
+                    live = [(labels, fut) for labels, fut in jobs if fut.set_running_or_notify_cancel()]
+                    self.stats["cancelled"] += len(jobs) - len(live)
+                    jobs = live
+                    payloads = ["\n".join(labels).encode("utf-8") for labels, _ in jobs]
+                    if payloads:
+                        sock.sendall(b"\n".join(payloads))
+            except OSError as e:
+                failed = [fut for _, fut in jobs if fut.running() or fut.set_running_or_notify_cancel()]
+                self.stats["errors"]    += len(failed)
+                self.stats["cancelled"] += len(jobs) - len(failed)
+                for fut in failed:
+                    fut.set_exception(e)
+                continue
+            secs = time.perf_counter() - t0
+
+            self.stats["jobs"]   += len(jobs)
+            self.stats["labels"] += sum(len(labels) for labels, _ in jobs)
+            self.stats["bytes"]  += sum(map(len, payloads))
+            self.stats["send_s"] += secs
+            for (labels, fut), payload in zip(jobs, payloads):
+                fut.set_result({"labels": len(labels), "bytes": len(payload), "seconds": secs})
+
+
+@st.cache_resource
+def get_spooler() -> LabelSpooler:
+    return LabelSpooler(PRINTER_HOST, PRINTER_PORT)
+
+
+def send_to_printer(labels: list):
+    """Spool labels and report the outcome on the page."""
+    fut = get_spooler().submit(labels)
+    try:
+        res = fut.result(timeout=PRINTER_TIMEOUT_S * 2)
+    except FutureTimeout:
+        # Only tell the operator a retry is safe if the job provably never reached the printer
+        if fut.cancel():
+            st.error(f"🖨️ Printer {PRINTER_HOST}:{PRINTER_PORT} did not respond — nothing was sent, "
+                     f"it is safe to try again.")
+        else:
+            st.warning(f"🖨️ Printer {PRINTER_HOST}:{PRINTER_PORT} is slow — the labels are already being "
+                       f"sent and may still print. Check the printer before sending them again.")
+        return
+    except Exception as e:
+        st.error(f"🖨️ Printer {PRINTER_HOST}:{PRINTER_PORT} unreachable — {e}")
+        return
+    rate = res["labels"] / res["seconds"] if res["seconds"] else float("inf")
+    st.success(
+        f"🖨️ Sent {res['labels']} label(s) to {PRINTER_HOST}:{PRINTER_PORT} — "
+        f"{res['bytes'] / 1024:.1f} KB in {res['seconds'] * 1000:.0f} ms ({rate:,.0f} labels/s)"
+    )
+
+
 # ─────────────────────────────────────────────
 #  BAGGING SECTION
 # ─────────────────────────────────────────────
+BAG_SIZE_KG = {"20kg": 20, "25kg": 25, "50lb": 22.68, "1000lb": 453.6}
+
+
+def box_total_weight_str(bag_size: str, qty: int) -> str:
+    if bag_size in BAG_SIZE_KG:
+        total_kg  = BAG_SIZE_KG[bag_size] * qty
+        total_lbs = total_kg * 2.20462
+        return f"{total_kg:.0f} kg / {total_lbs:.0f} lbs"
+    return "— see operator"
+
+
+def box_label_info(run: dict) -> dict:
+    """Box label fields for one bagging run (a Storage.lookup_run / pallet_runs record)."""
+    return {
+        "run_ref":          run["run_ref"] or "",
+        "product":          run["product"],
+        "bag_size_unit":    run["bag_size_unit"],
+        "qty":              run["quantity"],
+        "total_weight_str": box_total_weight_str(run["bag_size_unit"], run["quantity"]),
+        "pallet_id":        run["pallet_id"],
+        "source_sack_id":   run["source_sack_id"],
+        "operator":         run["operator"],
+        "date_str":         str(run["timestamp"])[:10],
+    }
+
+
+def pallet_box_labels(runs: pd.DataFrame, copies: int) -> list:
+    """ZPL box labels for every bagging run on a pallet (Storage.pallet_runs), `copies` of each."""
+    labels = []
+    for run in frame_records(runs):
+        info = box_label_info(run)
+        labels.extend(zpl_box_label(info, i, copies) for i in range(1, copies + 1))
+    return labels
+
+
 def page_bagging():
     st.title("🛍️ Bagging Operations")
     st.write("Assign a supersack from inventory to a bagging run and print the box/pallet label.")
 
+    with st.expander("🖨️ Print all labels for a pallet"):
+        p1, p2 = st.columns([3, 1])
+        with p1:
+            reprint_pallet = st.text_input("Pallet / Gaylord Box ID", key="reprint_pallet", placeholder="e.g. PAL-001")
+        with p2:
+            reprint_copies = st.number_input("Copies each", min_value=1, max_value=10, value=1, key="reprint_copies")
+        if st.button("🖨️ Send pallet labels to printer", use_container_width=True) and reprint_pallet.strip():
+            runs = get_storage().pallet_runs(reprint_pallet.strip())
+            labels = pallet_box_labels(runs, int(reprint_copies))
+            if labels:
+                send_to_printer(labels)
+            else:
+                st.warning(f"No bagging runs found for pallet {reprint_pallet.strip()}.")
+
     # ── Load available supersacks ──
-    conn = get_conn()
-    sacks_df = pd.read_sql_query(
-        """SELECT bag_ref, product, location_id, weight_lbs
-           FROM test_results
-           WHERE status = 'Inventory'
-           ORDER BY timestamp ASC""",
-        conn
-    )
-    conn.close()
+    with get_storage().snapshot() as read:
+        sacks_df = read("test_results", ["bag_ref", "product", "location_id", "weight_lbs"],
+                        "status = 'Inventory'", order="timestamp ASC")
 
     if sacks_df.empty:
         st.warning("No supersacks currently in inventory to process.")
@@ -403,47 +2206,16 @@ def page_bagging():
         operator = st.session_state["user_display"]
         run_ref  = f"BAG-{now.strftime('%Y%m%d-%H%M%S')}"
 
-        # Calculate total weight
-        size_to_kg = {"20kg": 20, "25kg": 25, "50lb": 22.68, "1000lb": 453.6}
-        if bag_size in size_to_kg:
-            total_kg  = size_to_kg[bag_size] * int(qty)
-            total_lbs = total_kg * 2.20462
-            total_weight_str = f"{total_kg:.0f} kg / {total_lbs:.0f} lbs"
-        else:
-            total_weight_str = "— see operator"
-
-        # Fetch supersack details
-        conn = get_conn()
-        c    = conn.cursor()
-        c.execute("SELECT product, location_id FROM test_results WHERE bag_ref=?", (selected_sack_id,))
-        row  = c.fetchone()
-        if not row:
+        total_weight_str = box_total_weight_str(bag_size, int(qty))
+
+        # Log the run, consume the supersack and free its slot in one write;
+        # a line bagging in the same second gets run_ref-2, -3, ...
+        res = get_storage().bagging_run(now, operator, selected_sack_id,
+                                        bag_size, int(qty), pallet.strip(), run_ref)
+        if res is None:
             st.error("Supersack not found — it may have already been processed.")
-            conn.close()
             return
-        product, loc_to_free = row
-
-        # 1. Log the bagging run (one row, no individual bag records needed)
-        c.execute(
-            """INSERT INTO bagging_ops
-               (timestamp, operator, source_sack_id, product, bag_size_unit, quantity, pallet_id)
-               VALUES (?,?,?,?,?,?,?)""",
-            (now, operator, selected_sack_id, product, bag_size, int(qty), pallet.strip())
-        )
-
-        # 2. Mark supersack consumed and free warehouse slot
-        c.execute(
-            """UPDATE test_results
-               SET status='Consumed (Bagged)',
-                   customer_name='Consumed — Bagged to ' || ?,
-                   shipped_date=?,
-                   shipped_by=?
-               WHERE bag_ref=?""",
-            (pallet.strip(), now.strftime("%Y-%m-%d"), operator, selected_sack_id)
-        )
-        c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (loc_to_free,))
-        conn.commit()
-        conn.close()
+        product, loc_to_free, run_ref = res
 
         st.success(
             f"✅ Bagging run **{run_ref}** recorded. "
@@ -475,6 +2247,9 @@ def page_bagging():
         if copies > 1:
             st.info(f"Showing {copies} label copies — print each one individually or use Ctrl+P / Cmd+P on the page.")
 
+        if st.button(f"🖨️ Send {copies} label(s) to thermal printer", use_container_width=True):
+            send_to_printer([zpl_box_label(info, i, copies) for i in range(1, copies + 1)])
+
         for i in range(1, copies + 1):
             if copies > 1:
                 st.caption(f"Copy {i} of {copies}")
@@ -517,16 +2292,16 @@ def login_page():
 def page_dashboard():
     st.title("📊 Production Dashboard")
 
-    conn = get_conn()
-    df = pd.read_sql_query("SELECT * FROM test_results", conn)
-    conn.close()
+    # Both tables come from one snapshot (per site) so KPIs never show a half-applied write
+    df, sb_df = read_scope(lambda read: (
+        read("test_results", DASHBOARD_COLS),
+        read("small_bags", ["status"]),
+    ))
 
     if df.empty:
         st.info("No production records yet.")
         return
 
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-
     # ── Top KPIs ──
     inv      = df[df["status"] == "Inventory"]
     ship     = df[df["status"] == "Shipped"]
@@ -539,6 +2314,13 @@ def page_dashboard():
     k4.metric("Total Weight in Stock (lbs)", f"{inv['weight_lbs'].sum():,.0f}")
     k5.metric("🚫 Rejected Bags",          len(rejected))
 
+    if "site" in df:
+        st.subheader("By Site")
+        for site, col in zip(sites(), st.columns(len(sites()))):
+            site_inv = inv[inv["site"] == site]
+            col.metric(site, f"{len(site_inv)} bags in stock",
+                       f"{(df['site'] == site).sum()} produced", delta_color="off")
+
     st.markdown("---")
 
     # ── Daily Production Chart ──
@@ -546,7 +2328,7 @@ def page_dashboard():
     cutoff = pd.Timestamp.now() - pd.Timedelta(days=30)
     daily  = (
         df[df["timestamp"] >= cutoff]
-        .groupby([df["timestamp"].dt.date, "product"])
+        .groupby([df["timestamp"].dt.date, "product"], observed=True)
         .size()
         .reset_index(name="count")
         .rename(columns={"timestamp": "Date"})
@@ -567,7 +2349,7 @@ def page_dashboard():
     # ── Quality averages (inventory) ──
     st.subheader("Average Quality — Current Inventory")
     if not inv.empty:
-        qa = inv[["pellet_hardness", "moisture", "toluene", "ash_content"]].mean()
+        qa = inv[["pellet_hardness", "moisture", "toluene", "ash_content"]].astype("float64").mean()
         q1, q2, q3, q4 = st.columns(4)
         q1.metric("Avg Hardness",  f"{qa['pellet_hardness']:.1f}")
         q2.metric("Avg Moisture %", f"{qa['moisture']:.2f}")
@@ -577,9 +2359,6 @@ def page_dashboard():
     # ── Small bags summary ──
     st.markdown("---")
     st.subheader("Small Bags Inventory")
-    conn2 = get_conn()
-    sb_df = pd.read_sql_query("SELECT * FROM small_bags", conn2)
-    conn2.close()
     if sb_df.empty:
         st.info("No small bags in system yet.")
     else:
@@ -602,10 +2381,14 @@ def page_dashboard():
 # ─────────────────────────────────────────────
 #  PRODUCTION / INVENTORY
 # ─────────────────────────────────────────────
+BAG_ID_ATTEMPTS = 20    # same-second suffixes tried before giving up
+
+
 def page_production():
     st.title("🏗️ Bulk Production — Record New Bag")
 
-    loc = get_next_loc()
+    storage = get_storage()
+    loc = storage.next_free_slot()
     if not loc:
         st.error("🚨 Warehouse Full — no available locations!")
         return
@@ -629,31 +2412,30 @@ def page_production():
         failures = qc_check(moist, ash, hard, tol)
         is_rejected = len(failures) > 0
         now = datetime.now()
-        bid = f"RCB-{now.strftime('%Y%m%d-%H%M%S')}"
+        base_id = f"RCB-{now.strftime('%Y%m%d-%H%M%S')}"
 
         # Rejected bags are recorded but NOT assigned a warehouse slot
         bag_status = "Rejected" if is_rejected else "Inventory"
         bag_loc    = "REJECTED"  if is_rejected else loc
 
-        conn = get_conn()
-        c = conn.cursor()
-        try:
-            c.execute(
-                """INSERT INTO test_results
-                   (bag_ref,timestamp,operator,product,location_id,status,
-                    weight_lbs,pellet_hardness,moisture,toluene,ash_content)
-                   VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
-                (bid, now, st.session_state["user_display"],
-                 prod, bag_loc, bag_status, weight, hard, moist, tol, ash),
-            )
-            if not is_rejected:
-                c.execute("UPDATE locations SET status='Occupied' WHERE loc_id=?", (loc,))
-            conn.commit()
-        except sqlite3.IntegrityError:
+        # Lines recording in the same second share the base ID; the UNIQUE
+        # index decides who keeps it and the others take -2, -3, ...
+        for attempt in range(1, BAG_ID_ATTEMPTS + 1):
+            bid = base_id if attempt == 1 else f"{base_id}-{attempt}"
+            try:
+                assigned = storage.record_bag(bid, now, st.session_state["user_display"],
+                                              prod, bag_loc, bag_status, weight, hard, moist, tol, ash)
+                break
+            except DuplicateBagError:
+                continue
+        else:
             st.error("Duplicate bag ID — please try again.")
-            conn.close()
             return
-        conn.close()
+        if assigned is None:
+            st.error("🚨 Warehouse Full — no available locations!")
+            return
+        if not is_rejected:
+            loc = bag_loc = assigned
 
         if is_rejected:
             st.error(f"🚫 Bag **{bid}** REJECTED — " + " | ".join(failures))
@@ -678,6 +2460,8 @@ def page_production():
     if "last_sack" in st.session_state:
         st.markdown("---")
         st.subheader("🏷️ Label for Last Recorded Bag")
+        if st.button("🖨️ Send to thermal printer"):
+            send_to_printer([zpl_bag_label(st.session_state["last_sack"])])
         render_label(st.session_state["last_sack"])
         if st.button("Clear Label"):
             del st.session_state["last_sack"]
@@ -687,33 +2471,120 @@ def page_production():
 # ─────────────────────────────────────────────
 #  SHIPPING — FIFO
 # ─────────────────────────────────────────────
+FIFO_HEAD_N     = 10    # bags shown up front on the shipping page
+FIFO_PAGE_SIZE  = 50    # bags per page when the full list is opened
+
+
+FIFO_COLS = ["bag_ref", "location_id", "timestamp", "weight_lbs", "ash_content",
+             "pellet_hardness", "moisture", "toluene"]
+
+
+FIFO_KEY_COLS = ["CAST(timestamp AS TEXT) AS ts_key", "id"]
+
+
+def fifo_page(read, prod: str, limit: int, after=None, before=None, from_end: bool = False) -> tuple:
+    """
+    One page of in-stock bags for `prod`, oldest first, keyset-paged on
+    (timestamp, id) off idx_test_results_fifo, so every page costs the same
+    however deep it is. Pass the key of the last row shown as `after` for the
+    next page, the key of the first row as `before` for the previous one, or
+    from_end for the final page. Returns (page, first key, last key); keys
+    are None for an empty page.
+    """
+    where, params, order = "product=? AND status='Inventory'", [prod], "timestamp ASC, id ASC"
+    if after:
+        where += " AND (timestamp, id) > (?, ?)"
+        params += after
+    elif before or from_end:
+        if before:
+            where += " AND (timestamp, id) < (?, ?)"
+            params += before
+        order = "timestamp DESC, id DESC"
+    df = read("test_results", FIFO_COLS + FIFO_KEY_COLS, where, tuple(params), order=order, limit=limit)
+    if order.endswith("DESC"):
+        df = df.iloc[::-1].reset_index(drop=True)
+    if df.empty:
+        return df.drop(columns=["ts_key", "id"]), None, None
+    keys = [(str(df["ts_key"].iat[i]), int(df["id"].iat[i])) for i in (0, -1)]
+    return df.drop(columns=["ts_key", "id"]), *keys
+
+
+def fifo_nav_go(move: str):
+    """Pager button callback: aim the next read at the page `move` leads to, from the current page's edge keys."""
+    nav = st.session_state["fifo_nav"]
+    if move == "first":
+        nav.update(pos=0, req={})
+    elif move == "prev":
+        nav.update(pos=max(0, nav["pos"] - FIFO_PAGE_SIZE), req={"before": nav["first"]})
+    elif move == "next":
+        nav.update(pos=nav["pos"] + nav["n"], req={"after": nav["last"]})
+    else:
+        nav.update(req={"from_end": True})
+
+
+def fifo_pager(read, prod: str, in_stock: int):
+    """
+    First / Prev / Next / Last over the full FIFO list. The request that
+    produced the current page is kept in session_state, so reruns redraw
+    the same page and a button only ever reads one page from its edge key.
+    """
+    nav = st.session_state.get("fifo_nav")
+    if not nav or nav["prod"] != prod:
+        nav = {"prod": prod, "pos": 0, "req": {}, "first": None, "last": None, "n": 0}
+
+    df, first, last = fifo_page(read, prod, FIFO_PAGE_SIZE, **nav["req"])
+    if "before" in nav["req"] and len(df) < FIFO_PAGE_SIZE:     # ran into the FIFO head
+        nav.update(pos=0, req={})
+        df, first, last = fifo_page(read, prod, FIFO_PAGE_SIZE)
+    elif df.empty and nav["req"]:                                # the page shipped out from under us
+        nav["req"] = {"from_end": True}
+        df, first, last = fifo_page(read, prod, FIFO_PAGE_SIZE, from_end=True)
+    if nav["req"].get("from_end") or nav["pos"] + len(df) > in_stock:    # last page, or stock shrank
+        nav["pos"] = max(0, in_stock - len(df))
+    nav.update(first=first, last=last, n=len(df))
+    st.session_state["fifo_nav"] = nav
+
+    st.caption(f"Bags {nav['pos'] + 1:,}–{nav['pos'] + len(df):,} of {in_stock:,} (oldest first)"
+               if len(df) else "No bags in stock.")
+    st.dataframe(df, use_container_width=True)
+
+    at_start, at_end = nav["pos"] == 0, nav["pos"] + len(df) >= in_stock
+    for col, (move, label, disabled) in zip(st.columns(4), [
+        ("first", "⏮ First", at_start), ("prev", "◀ Prev", at_start),
+        ("next",  "Next ▶",  at_end),   ("last", "Last ⏭", at_end),
+    ]):
+        col.button(label, key=f"fifo_{move}", disabled=disabled, on_click=fifo_nav_go, args=(move,),
+                   use_container_width=True)
+
+
 def page_shipping():
     st.title("🚢 FIFO Shipping")
 
     prod = st.selectbox("Select Product", PRODUCTS)
 
-    conn = get_conn()
-    fifo_df = pd.read_sql_query(
-        """SELECT bag_ref, location_id, timestamp, weight_lbs, ash_content,
-                  pellet_hardness, moisture, toluene
-           FROM test_results
-           WHERE product=? AND status='Inventory'
-           ORDER BY timestamp ASC""",
-        conn, params=(prod,)
-    )
-    conn.close()
+    # Only the FIFO head and a count up front — both are index range reads
+    storage = get_storage()
+    with storage.snapshot() as read:
+        in_stock = int(read("test_results", ["COUNT(*) AS n"], "product=? AND status='Inventory'",
+                            (prod,))["n"].iat[0])
+        head_df, _, _ = fifo_page(read, prod, FIFO_HEAD_N)
 
-    if fifo_df.empty:
+    if head_df.empty:
         st.warning(f"No **{prod}** bags currently in inventory.")
         return
 
-    st.info(f"📦 **{len(fifo_df)} bags** in stock for {prod}. Oldest bag ships first.")
-    oldest = fifo_df.iloc[0]
+    st.info(f"📦 **{in_stock} bags** in stock for {prod}. Oldest bag ships first.")
+    oldest = head_df.iloc[0]
     st.metric("Next Bag to Ship", oldest["bag_ref"])
     st.metric("Location", oldest["location_id"])
 
+    with st.expander(f"📋 Next {len(head_df)} bags to ship (oldest first)", expanded=False):
+        st.dataframe(head_df, use_container_width=True)
+
     with st.expander("📋 All available bags (oldest first)", expanded=False):
-        st.dataframe(fifo_df, use_container_width=True)
+        if st.toggle("Load full list", key="fifo_load_all"):
+            with storage.snapshot() as read:
+                fifo_pager(read, prod, in_stock)
 
     st.markdown("---")
     st.subheader("Ship Bags")
@@ -722,8 +2593,8 @@ def page_shipping():
         cust     = st.text_input("Customer Name *")
         ship_by  = st.text_input("Shipped By (driver / reference) *")
         qty      = st.number_input(
-            f"Number of bags to ship (max {len(fifo_df)})",
-            min_value=1, max_value=len(fifo_df), value=1, step=1
+            f"Number of bags to ship (max {in_stock})",
+            min_value=1, max_value=in_stock, value=1, step=1
         )
         note     = st.text_area("Notes (optional)")
         submit   = st.form_submit_button("🚢 Confirm Shipment", use_container_width=True)
@@ -736,22 +2607,10 @@ def page_shipping():
             st.error("'Shipped By' is required.")
             return
 
-        bags_to_ship = fifo_df.head(int(qty))["bag_ref"].tolist()
-        locs_to_free = fifo_df.head(int(qty))["location_id"].tolist()
-        today_str    = str(date.today())
-
-        conn = get_conn()
-        c = conn.cursor()
-        for bag, loc in zip(bags_to_ship, locs_to_free):
-            c.execute(
-                """UPDATE test_results
-                   SET status='Shipped', customer_name=?, shipped_date=?, shipped_by=?
-                   WHERE bag_ref=?""",
-                (cust.strip(), today_str, ship_by.strip(), bag),
-            )
-            c.execute("UPDATE locations SET status='Available' WHERE loc_id=?", (loc,))
-        conn.commit()
-        conn.close()
+        # The writer re-reads the FIFO head inside its transaction, so two
+        # operators shipping at once can never pick the same bag.
+        shipped = storage.ship_fifo(prod, int(qty), cust.strip(), ship_by.strip(), str(date.today()))
+        qty = len(shipped)
 
         st.success(f"✅ Shipped **{qty} bag(s)** to **{cust}**")
         st.balloons()
@@ -759,28 +2618,299 @@ def page_shipping():
             st.info(f"Note saved: {note}")
 
 
+# ─────────────────────────────────────────────
+#  PICK LISTS  (FIFO within a tolerance, sequenced for the shortest drive)
+# ─────────────────────────────────────────────
+# Warehouse geometry for route planning: WH-### slots run down aisles of
+# SLOTS_PER_AISLE (WH-001..020 = aisle 1, ...). Every aisle opens onto a
+# front and a back cross-aisle; the dock is at the front of aisle 1.
+SLOTS_PER_AISLE  = 20
+AISLE_PITCH_M    = 4.0     # centre-to-centre distance between aisles
+SLOT_PITCH_M     = 1.5     # distance between neighbouring slots in an aisle
+AISLE_LENGTH_M   = (SLOTS_PER_AISLE + 1) * SLOT_PITCH_M
+PICK_TOLERANCE_H = 72      # default FIFO slack: no bag left behind is more than this much older than a pick
+
+
+def slot_xy(loc_ids) -> tuple:
+    """(aisle index, depth from the front cross-aisle in m) arrays for WH-### slot ids."""
+    n = pd.to_numeric(pd.Series(loc_ids, dtype="string").str.extract(r"(\d+)$")[0], errors="coerce")
+    n = n.fillna(1).astype(int).to_numpy() - 1
+    return n // SLOTS_PER_AISLE, (n % SLOTS_PER_AISLE + 1) * SLOT_PITCH_M
+
+
+def travel_m(a1, d1, a2, d2):
+    """Forklift distance between slots: along the aisle, or out via the nearer cross-aisle."""
+    across = np.abs(a1 - a2) * AISLE_PITCH_M + np.minimum(d1 + d2, 2 * AISLE_LENGTH_M - d1 - d2)
+    return np.where(a1 == a2, np.abs(d1 - d2), across)
+
+
+def route_m(aisle, depth):
+    """
+    Length of dock -> stops in the given order -> dock. 2-D inputs are one
+    candidate route per row and give an array of lengths.
+    """
+    a2, d2 = np.atleast_2d(aisle), np.atleast_2d(depth)
+    dock = np.zeros((len(a2), 1))
+    a, d = np.hstack([dock, a2, dock]), np.hstack([dock, d2, dock])
+    lengths = travel_m(a[:, :-1], d[:, :-1], a[:, 1:], d[:, 1:]).sum(axis=1)
+    return float(lengths[0]) if np.ndim(aisle) == 1 else lengths
+
+
+def s_shape_order(aisle, depth) -> np.ndarray:
+    """
+    Row-wise stop order for an S-shape route: visited aisles in order,
+    alternating front->back and back->front. Returns indices into each row.
+    """
+    aisle, depth = np.atleast_2d(aisle), np.atleast_2d(depth)
+    if not aisle.shape[1]:
+        return np.zeros(aisle.shape, dtype=int)
+    by_aisle = np.argsort(aisle, axis=1, kind="stable")
+    sorted_a = np.take_along_axis(aisle, by_aisle, axis=1)
+    dense = np.cumsum(np.diff(sorted_a, axis=1, prepend=sorted_a[:, :1] - 1) != 0, axis=1)
+    rank = np.empty_like(dense)
+    np.put_along_axis(rank, by_aisle, dense, axis=1)
+    # One sort key: aisle first, then depth (descending in every other visited aisle)
+    return np.argsort(aisle * (2 * AISLE_LENGTH_M + 1) + np.where(rank % 2 == 1, depth, -depth), axis=1)
+
+
+def s_route_m(aisle, depth):
+    """route_m of each row's stops taken in S-shape order."""
+    aisle, depth = np.atleast_2d(aisle), np.atleast_2d(depth)
+    order = s_shape_order(aisle, depth)
+    return route_m(np.take_along_axis(aisle, order, axis=1), np.take_along_axis(depth, order, axis=1))
+
+
+PICK_SWAP_ROUNDS = 100         # local-search rounds before settling for the best plan so far
+PICK_SWAP_BATCH  = (10, 20)    # per product and round: removals x insertions evaluated exactly
+
+
+def plan_picks(stock: pd.DataFrame, order: dict, tolerance: pd.Timedelta) -> tuple:
+    """
+    Choose and sequence bags for a multi-product order.
+
+    stock has bag_ref, product, location_id, timestamp for in-stock bags;
+    order maps product -> bag count. Per product the plan starts from
+    strict FIFO (the `qty` oldest bags), then repeatedly makes the single
+    swap — one picked bag out, a newer one of the same product in — that
+    shortens the S-shape route the most, provided no bag left behind is
+    more than `tolerance` older than the newest bag picked. It stops when
+    no swap makes the route shorter, so a newer bag only ever replaces an
+    older one when that saves distance, and a zero tolerance is strict FIFO.
+    Each round scores a batch of swaps exactly: the picks whose detour is
+    longest, against the insertions nearest the current picks.
+    Returns (picks DataFrame in route order, stats dict).
+    """
+    t0 = time.perf_counter()
+    stock = stock.reset_index(drop=True)
+    aisle, depth = slot_xy(stock["location_id"])
+    ts = pd.to_datetime(stock["timestamp"]).to_numpy("datetime64[ns]").astype(np.int64)
+    tol = int(tolerance.value)
+    product = stock["product"].to_numpy()
+    picked = np.zeros(len(stock), dtype=bool)
+
+    for prod, qty in order.items():
+        if qty <= 0:
+            continue
+        cand = np.flatnonzero(product == prod)
+        if len(cand) < qty:
+            raise ValueError(f"only {len(cand)} {prod} bag(s) in stock, {qty} ordered")
+        picked[cand[np.argsort(ts[cand], kind="stable")[:qty]]] = True
+    fifo = np.flatnonzero(picked)
+    route = fifo_route = float(s_route_m(aisle[fifo], depth[fifo])[0])
+    n_out, n_in = PICK_SWAP_BATCH
+
+    for _ in range(PICK_SWAP_ROUNDS):
+        sel = np.flatnonzero(picked)
+        k = len(sel)
+        # Detour of each pick on the current route: in + out legs minus the shortcut past it
+        seq = sel[s_shape_order(aisle[sel], depth[sel])[0]]
+        a, d = np.r_[0, aisle[seq], 0], np.r_[0.0, depth[seq], 0.0]
+        detour = np.empty(k)
+        detour[np.searchsorted(sel, seq)] = (travel_m(a[:-2], d[:-2], a[1:-1], d[1:-1])
+                                             + travel_m(a[1:-1], d[1:-1], a[2:], d[2:])
+                                             - travel_m(a[:-2], d[:-2], a[2:], d[2:]))
+
+        outs, ins = [], []
+        for prod, qty in order.items():
+            if qty <= 0:
+                continue
+            mine = sel[product[sel] == prod]
+            left = np.flatnonzero(~picked & (product == prod))
+            if not len(left):
+                continue
+            # Nothing newer than the oldest bag left behind + tolerance can come in
+            pool = left[ts[left] <= ts[left].min() + tol]
+            near = travel_m(aisle[pool][:, None], depth[pool][:, None],
+                            aisle[sel][None, :], depth[sel][None, :]).min(axis=1)
+            pool = pool[np.argsort(near, kind="stable")[:n_in]]
+            mine = mine[np.argsort(-detour[np.searchsorted(sel, mine)], kind="stable")[:n_out]]
+            r, c = (x.ravel() for x in np.meshgrid(mine, pool, indexing="ij"))
+
+            # FIFO tolerance after the swap: newest picked vs oldest left behind
+            p_ts = np.r_[np.iinfo(np.int64).min, np.sort(ts[sel[product[sel] == prod]])]
+            l_ts = np.r_[np.sort(ts[left]), np.iinfo(np.int64).max]
+            newest_rest = np.where(ts[r] == p_ts[-1], p_ts[-2], p_ts[-1])     # newest pick once r is out
+            oldest_rest = np.where(ts[c] == l_ts[0], l_ts[1], l_ts[0])        # oldest left once c is in
+            ok = np.maximum(newest_rest, ts[c]) - np.minimum(oldest_rest, ts[r]) <= tol
+            outs.append(r[ok])
+            ins.append(c[ok])
+
+        r, c = np.concatenate(outs or [[]]).astype(int), np.concatenate(ins or [[]]).astype(int)
+        if not len(r):
+            break
+        swapped = np.broadcast_to(sel, (len(r), k)).copy()
+        swapped[np.arange(len(r)), np.searchsorted(sel, r)] = c
+        lengths = s_route_m(aisle[swapped], depth[swapped])
+        best = int(np.argmin(lengths))
+        if lengths[best] >= route - 1e-6:
+            break
+        picked[r[best]], picked[c[best]] = False, True
+        route = float(lengths[best])
+
+    chosen = np.flatnonzero(picked)
+    chosen = chosen[s_shape_order(aisle[chosen], depth[chosen])[0]]
+    picks = stock.loc[chosen, ["bag_ref", "product", "location_id", "timestamp"]].reset_index(drop=True)
+    picks.insert(0, "seq", np.arange(1, len(picks) + 1))
+    picks["aisle"] = aisle[chosen] + 1
+
+    a, d = aisle[chosen], depth[chosen]
+    picks["leg_m"] = travel_m(np.r_[0, a[:-1]], np.r_[0.0, d[:-1]], a, d).round(1)
+
+    stats = {
+        "bags":         len(picks),
+        "route_m":      route_m(a, d),
+        "fifo_route_m": fifo_route,
+        "substituted":  len(set(chosen) - set(fifo)),
+        "aisles":       int(picks["aisle"].nunique()),
+        "ms":           (time.perf_counter() - t0) * 1000,
+    }
+    return picks, stats
+
+
+def render_pick_sheet(pl: dict):
+    """Printable, sequenced pick sheet with a tick box per bag."""
+    rows = "".join(
+        f"<tr><td>{r.seq}</td><td class='loc'>{r.location_id}</td><td>{r.aisle}</td>"
+        f"<td>{r.bag_ref}</td><td>{r.product}</td><td>{r.timestamp:%Y-%m-%d %H:%M}</td>"
+        f"<td class='tick'>☐</td></tr>"
+        for r in pl["picks"].itertuples()
+    )
+    order_txt = " · ".join(f"{qty} × {prod}" for prod, qty in pl["order"].items() if qty)
+    html = f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<style>
+  body {{ font-family: Arial, sans-serif; padding: 12px; background: white; }}
+  h2   {{ margin: 0 0 4px 0; }}
+  .meta {{ font-size: 14px; color: #444; margin-bottom: 10px; }}
+  table {{ border-collapse: collapse; width: 100%; font-size: 15px; }}
+  th, td {{ border: 1px solid #999; padding: 5px 8px; text-align: left; }}
+  th   {{ background: #eee; }}
+  .loc {{ font-weight: bold; font-size: 17px; }}
+  .tick {{ text-align: center; font-size: 20px; }}
+  .printbtn {{
+    display: block; width: 100%; margin-top: 14px; padding: 13px;
+    background: #28a745; color: white; border: none; font-size: 19px;
+    cursor: pointer; border-radius: 6px; font-family: Arial;
+  }}
+  @media print {{ .printbtn {{ display: none; }} }}
+</style>
+</head>
+<body>
+<h2>Pick Sheet — {pl['customer']}</h2>
+<div class="meta">{order_txt} · {pl['stats']['aisles']} aisle(s) · route ≈ {pl['stats']['route_m']:.0f} m ·
+ shipped by {pl['ship_by']} · {pl['created']}</div>
+<table>
+<tr><th>#</th><th>Slot</th><th>Aisle</th><th>Bag</th><th>Product</th><th>Made</th><th>✔</th></tr>
+{rows}
+</table>
+<button class="printbtn" onclick="window.print()">🖨️ Print Pick Sheet</button>
+</body>
+</html>"""
+    st.components.v1.html(html, height=min(900, 160 + 34 * len(pl["picks"])), scrolling=True)
+
+
+def page_picklist():
+    st.title("🧭 Pick List")
+    st.write("Build one pick list for a multi-product order. Bags stay within the FIFO "
+             "tolerance and are sequenced aisle by aisle for the shortest forklift route.")
+
+    storage = get_storage()
+    with storage.snapshot() as read:
+        stock = read("test_results", ["bag_ref", "product", "location_id", "timestamp"], "status='Inventory'")
+
+    if stock.empty:
+        st.warning("No supersacks currently in inventory.")
+        return
+    counts = stock["product"].value_counts()
+
+    with st.form("pick_form"):
+        order = {}
+        for prod, col in zip(PRODUCTS, st.columns(len(PRODUCTS))):
+            n = int(counts.get(prod, 0))
+            order[prod] = col.number_input(f"{prod} bags ({n} in stock)", min_value=0, max_value=n,
+                                           value=0, step=1, key=f"pick_qty_{prod}")
+        tol_h = st.number_input("FIFO tolerance (hours)", min_value=0, value=PICK_TOLERANCE_H, step=12,
+                                help="0 = strict FIFO. Otherwise a newer bag nearby may replace an older one far away, "
+                                     "as long as no bag left behind is more than this much older than the newest picked.")
+        c1, c2 = st.columns(2)
+        cust    = c1.text_input("Customer Name *", key="pick_cust")
+        ship_by = c2.text_input("Shipped By (driver / reference) *", key="pick_ship_by")
+        build   = st.form_submit_button("🧭 Build Pick List", use_container_width=True)
+
+    if build:
+        if not sum(order.values()):
+            st.error("Enter a quantity for at least one product.")
+        elif not cust.strip() or not ship_by.strip():
+            st.error("Customer name and 'Shipped By' are required.")
+        else:
+            picks, stats = plan_picks(stock, order, pd.Timedelta(hours=tol_h))
+            st.session_state["pick_list"] = {
+                "picks": picks, "stats": stats, "order": order,
+                "customer": cust.strip(), "ship_by": ship_by.strip(),
+                "created": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            }
+
+    pl = st.session_state.get("pick_list")
+    if not pl:
+        return
+    stats = pl["stats"]
+    saved = 1 - stats["route_m"] / stats["fifo_route_m"] if stats["fifo_route_m"] else 0.0
+
+    st.markdown("---")
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Bags to Pick", stats["bags"])
+    k2.metric("Route", f"{stats['route_m']:,.0f} m", f"{-saved:.0%} vs strict FIFO", delta_color="inverse")
+    k3.metric("Aisles Visited", stats["aisles"])
+    k4.metric("Newer Bags Substituted", stats["substituted"])
+    st.caption(f"Planned in {stats['ms']:.0f} ms.")
+
+    render_pick_sheet(pl)
+    st.download_button("⬇️ Download Pick List CSV", pl["picks"].to_csv(index=False).encode("utf-8"),
+                       f"pick_list_{pl['customer']}_{date.today()}.csv", "text/csv")
+
+    c1, c2 = st.columns(2)
+    if c1.button("🚢 Confirm Picked & Ship", use_container_width=True, type="primary"):
+        refs = list(pl["picks"]["bag_ref"])
+        shipped = storage.ship_bags(refs, pl["customer"], pl["ship_by"], str(date.today()))
+        del st.session_state["pick_list"]
+        st.success(f"✅ Shipped **{len(shipped)} bag(s)** to **{pl['customer']}**")
+        if len(shipped) < len(refs):
+            gone = sorted(set(refs) - {b for b, _ in shipped})
+            st.warning(f"{len(gone)} bag(s) had already left inventory and were skipped: " + ", ".join(gone))
+    if c2.button("✖️ Discard Pick List", use_container_width=True):
+        del st.session_state["pick_list"]
+        st.rerun()
+
+
 # ─────────────────────────────────────────────
 #  LOCATION DIRECTORY
 # ─────────────────────────────────────────────
 def page_locations():
     st.title("📂 Warehouse Location Directory")
 
-    conn = get_conn()
-    df = pd.read_sql_query(
-        """SELECT l.loc_id   AS 'Location',
-                  l.status   AS 'Status',
-                  t.product  AS 'Product',
-                  t.bag_ref  AS 'Bag ID',
-                  t.weight_lbs AS 'Weight (lbs)',
-                  t.ash_content AS 'Ash %',
-                  t.timestamp AS 'Recorded'
-           FROM locations l
-           LEFT JOIN test_results t
-             ON l.loc_id = t.location_id AND t.status = 'Inventory'
-           ORDER BY l.loc_id ASC""",
-        conn,
-    )
-    conn.close()
+    df = get_storage().locations_view()
 
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Total Slots",       len(df))
@@ -801,14 +2931,19 @@ def page_locations():
 def page_records():
     st.title("📋 Master Records")
 
+    df, sb_df, br_df = read_scope(lambda read: (
+        read("test_results", RECORDS_COLS,     order="timestamp DESC"),
+        read("small_bags",   SMALL_BAG_COLS,   order="timestamp DESC"),
+        read("bagging_ops",  BAGGING_RUN_COLS, order="timestamp DESC"),
+    ))
+    if "site" in df:                                 # merge the per-site orderings
+        df, sb_df, br_df = (f.sort_values("timestamp", ascending=False, ignore_index=True)
+                            for f in (df, sb_df, br_df))
+
     tab1, tab2, tab3 = st.tabs(["📦 Supersacks", "🛍️ Small Bags", "🗂️ Bagging Runs"])
 
     # ── Tab 1: Supersacks ──
     with tab1:
-        conn = get_conn()
-        df = pd.read_sql_query("SELECT * FROM test_results ORDER BY timestamp DESC", conn)
-        conn.close()
-
         if df.empty:
             st.info("No supersack records yet.")
         else:
@@ -822,7 +2957,6 @@ def page_records():
                     date_from = st.date_input("From", value=date(2020, 1, 1), key="rec_from")
                     date_to   = st.date_input("To",   value=date.today(),     key="rec_to")
 
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
             mask = (df["timestamp"].dt.date >= date_from) & (df["timestamp"].dt.date <= date_to)
             if prod_f != "All": mask &= df["product"] == prod_f
             if stat_f != "All": mask &= df["status"]  == stat_f
@@ -836,10 +2970,6 @@ def page_records():
 
     # ── Tab 2: Small Bags ──
     with tab2:
-        conn = get_conn()
-        sb_df = pd.read_sql_query("SELECT * FROM small_bags ORDER BY timestamp DESC", conn)
-        conn.close()
-
         if sb_df.empty:
             st.info("No small bag records yet.")
         else:
@@ -866,10 +2996,6 @@ def page_records():
 
     # ── Tab 3: Bagging Runs ──
     with tab3:
-        conn = get_conn()
-        br_df = pd.read_sql_query("SELECT * FROM bagging_ops ORDER BY timestamp DESC", conn)
-        conn.close()
-
         if br_df.empty:
             st.info("No bagging runs recorded yet.")
         else:
@@ -880,12 +3006,414 @@ def page_records():
                                file_name=f"bagging_runs_{date.today()}.csv", mime="text/csv")
 
 
+# ─────────────────────────────────────────────
+#  REACTOR TRENDS
+# ─────────────────────────────────────────────
+# rollup table -> (bucket prefix length, bucket format, caption)
+ROLLUPS = {
+    "process_logs_1m": (16, "%Y-%m-%d %H:%M", "1-minute"),
+    "process_logs_1h": (13, "%Y-%m-%d %H",    "1-hour"),
+}
+
+TREND_RANGES = {
+    "Last hour":     (pd.Timedelta(hours=1),   "process_logs_1m"),
+    "Last 24 hours": (pd.Timedelta(days=1),    "process_logs_1m"),
+    "Last 7 days":   (pd.Timedelta(days=7),    "process_logs_1h"),
+    "Last 30 days":  (pd.Timedelta(days=30),   "process_logs_1h"),
+    "Last 365 days": (pd.Timedelta(days=365),  "process_logs_1h"),
+}
+
+
+def page_reactor():
+    st.title("🔥 Reactor Trends")
+
+    conn = get_conn()
+    cols = ", ".join(PROCESS_CHANNELS)
+    latest = pd.read_sql_query(
+        f"SELECT timestamp, {cols} FROM process_logs ORDER BY timestamp DESC LIMIT 1", conn
+    )
+    if latest.empty:
+        conn.close()
+        st.info("No reactor readings yet. Start the PLC feed (plc_sim.py) to populate process_logs.")
+        return
+
+    r = latest.iloc[0]
+    st.caption(f"Latest reading: {r['timestamp']}")
+    m1, m2, m3, m4, m5, m6 = st.columns(6)
+    m1.metric("Reactor 1 Temp", f"{r['reactor_1_temp']:.1f}")
+    m2.metric("Reactor 2 Temp", f"{r['reactor_2_temp']:.1f}")
+    m3.metric("Reactor 1 Hz",   f"{r['reactor_1_hz']:.1f}")
+    m4.metric("Reactor 2 Hz",   f"{r['reactor_2_hz']:.1f}")
+    m5.metric("Feed Rate",      f"{r['feed_rate']:.1f}")
+    m6.metric("Toluene",        f"{r['toluene_value']:.1f}")
+
+    st.markdown("---")
+    span = st.selectbox("Range", list(TREND_RANGES.keys()), index=1)
+    delta, table = TREND_RANGES[span]
+    prefix_len, bucket_fmt, grain = ROLLUPS[table]
+    since = (datetime.now() - delta.to_pytimedelta()).strftime(TS_FMT)[:prefix_len]
+
+    # Charts always read a rollup table — never the raw 10 Hz samples
+    avgs = ", ".join(f"{ch}_avg AS {ch}" for ch in PROCESS_CHANNELS)
+    df = pd.read_sql_query(
+        f"SELECT bucket, {avgs} FROM {table} WHERE bucket >= ? ORDER BY bucket ASC",
+        conn, params=(since,)
+    )
+    conn.close()
+
+    if df.empty:
+        st.info("No readings in this range.")
+        return
+
+    df["bucket"] = pd.to_datetime(df["bucket"], format=bucket_fmt)
+    df = df.set_index("bucket")
+    st.caption(f"{len(df):,} {grain} points")
+
+    st.subheader("Reactor Temperatures")
+    st.line_chart(df[["reactor_1_temp", "reactor_2_temp"]])
+    st.subheader("Reactor Frequency (Hz)")
+    st.line_chart(df[["reactor_1_hz", "reactor_2_hz"]])
+    st.subheader("Feed Rate & Toluene")
+    st.line_chart(df[["feed_rate", "toluene_value"]])
+
+
+# ─────────────────────────────────────────────
+#  QUALITY CORRELATION  (supersacks as-of joined to reactor conditions)
+# ─────────────────────────────────────────────
+ASOF_TOLERANCE = pd.Timedelta(minutes=15)   # ignore readings older than this
+
+
+def load_quality_correlation(conn, date_from: date, date_to: date) -> pd.DataFrame:
+    """
+    Attach the last complete minute of reactor readings before each supersack
+    was produced. Both sides are read pre-sorted off their timestamp indexes
+    and joined with pd.merge_asof, so a year of bags against a year of
+    1-minute rollups is a single vectorized pass.
+    """
+    lo = f"{date_from} 00:00:00"
+    hi = f"{date_to} 99"
+    sacks = pd.read_sql_query(
+        """SELECT bag_ref, timestamp, product, status, operator, weight_lbs,
+                  pellet_hardness, moisture, toluene, ash_content
+           FROM test_results
+           WHERE timestamp >= ? AND timestamp <= ?
+           ORDER BY timestamp ASC""",
+        conn, params=(lo, hi),
+    )
+    if sacks.empty:
+        return sacks
+
+    avgs = ", ".join(f"{ch}_avg AS {ch}" for ch in PROCESS_CHANNELS)
+    since = (pd.Timestamp(date_from) - ASOF_TOLERANCE - pd.Timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M")
+    readings = pd.read_sql_query(
+        f"""SELECT bucket, n AS samples, {avgs}
+            FROM process_logs_1m
+            WHERE bucket >= ? AND bucket <= ?
+            ORDER BY bucket ASC""",
+        conn, params=(since, hi),
+    )
+
+    sacks["timestamp"] = pd.to_datetime(sacks["timestamp"], format="ISO8601")
+    sacks["qc_fail"] = qc_fail_mask(sacks)
+
+    # A minute bucket is only "preceding" once it has closed
+    readings["reading_time"] = (
+        pd.to_datetime(readings["bucket"], format="%Y-%m-%d %H:%M") + pd.Timedelta(minutes=1)
+    )
+    readings = readings.drop(columns="bucket")
+
+    return pd.merge_asof(
+        sacks, readings,
+        left_on="timestamp", right_on="reading_time",
+        direction="backward", tolerance=ASOF_TOLERANCE,
+    )
+
+
+def page_quality():
+    st.title("🔬 Quality Correlation")
+    st.write("Reactor conditions in the minute before each supersack was produced.")
+
+    f1, f2, f3 = st.columns(3)
+    with f1:
+        date_from = st.date_input("From", value=date.today() - pd.Timedelta(days=30), key="qc_from")
+    with f2:
+        date_to   = st.date_input("To",   value=date.today(), key="qc_to")
+    with f3:
+        only_fail = st.checkbox("Only QC failures / rejected", key="qc_only_fail")
+
+    t0 = time.perf_counter()
+    with snapshot_conn() as conn:
+        df = load_quality_correlation(conn, date_from, date_to)
+
+    if df.empty:
+        st.info("No supersacks produced in this range.")
+        return
+    st.caption(f"Joined {len(df):,} supersacks in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    failed = df["qc_fail"] | (df["status"] == "Rejected")
+    matched = df["reading_time"].notna()
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Supersacks",            len(df))
+    k2.metric("QC Failures / Rejected", int(failed.sum()))
+    k3.metric("With Reactor Data",     int(matched.sum()))
+
+    if matched.any():
+        st.subheader("Average Reactor Conditions — Pass vs Fail")
+        summary = (
+            df[matched]
+            .assign(result=failed[matched].map({True: "Fail", False: "Pass"}))
+            .groupby("result")[PROCESS_CHANNELS]
+            .mean()
+        )
+        st.dataframe(summary, use_container_width=True)
+
+    view = df[failed] if only_fail else df
+    st.markdown(f"**{len(view)} records** shown.")
+    st.dataframe(view, use_container_width=True, height=450)
+    csv = view.to_csv(index=False).encode("utf-8")
+    st.download_button("⬇️ Download Quality Correlation CSV", data=csv,
+                       file_name=f"quality_correlation_{date.today()}.csv", mime="text/csv")
+
+
+# ─────────────────────────────────────────────
+#  SCAN STATION
+# ─────────────────────────────────────────────
+def parse_scan(payload: str) -> dict:
+    """
+    Split a scanned QR payload.
+    Bag labels encode the bare bag ID; box labels encode
+    'run_ref | product | size x qty | pallet_id'.
+    """
+    parts = [p.strip() for p in payload.strip().split("|")]
+    if len(parts) >= 4:
+        return {"kind": "box", "run_ref": parts[0], "pallet_id": parts[-1]}
+    return {"kind": "bag", "bag_ref": parts[0]}
+
+
+def scan_lookup(storage, payload: str):
+    """
+    Resolve a scan to (kind, record): ('bag', supersack) for a supersack
+    label, ('box', bagging run) for a box label. A box label never resolves
+    to its source supersack — that sack was consumed by the run. Each is a
+    single indexed lookup (bag_ref UNIQUE, bagging_ops run_ref / pallet_id),
+    so latency does not grow with table size. record is None if nothing matches.
+    """
+    scan = parse_scan(payload)
+    if scan["kind"] == "box":
+        return "box", storage.lookup_run(scan["run_ref"], scan["pallet_id"])
+    return "bag", storage.lookup_bag(scan["bag_ref"])
+
+
+def show_box_scan(run: dict):
+    """A scanned box label: the bagging run it belongs to, with a reprint."""
+    info = box_label_info(run)
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Run",      info["run_ref"] or "n/a")
+    k2.metric("Product",  info["product"])
+    k3.metric("Bags",     f"{info['bag_size_unit']} x {info['qty']}")
+    k4.metric("Pallet",   info["pallet_id"])
+    st.caption(
+        f"Bagged {info['date_str']} by {info['operator']} · {info['total_weight_str']} · "
+        f"Source supersack: {info['source_sack_id']}"
+    )
+    st.info("🗂️ This is a box label. Ship, relocate and consume act on supersacks — "
+            "scan a supersack label to use them.")
+    if st.button("🖨️ Reprint this box label", use_container_width=True):
+        send_to_printer([zpl_box_label(info)])
+
+
+def page_scan():
+    st.title("📷 Scan Station")
+    st.write("Scan a supersack label or a box/pallet label to see its state and act on it.")
+
+    payload = st.text_input("Scan or type bag ID", key="scan_payload",
+                            placeholder="RCB-20240101-120000  or  BAG-... | product | size x qty | PAL-001")
+    if not payload.strip():
+        return
+
+    t0 = time.perf_counter()
+    storage = get_storage()
+    kind, rec = scan_lookup(storage, payload)
+    st.caption(f"Lookup: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    if rec is None:
+        st.error("No matching box label found." if kind == "box" else "No matching bag found.")
+        return
+    if kind == "box":
+        show_box_scan(rec)
+        return
+
+    sack = rec
+    k1, k2, k3, k4 = st.columns(4)
+    k1.metric("Bag ID",   sack["bag_ref"])
+    k2.metric("Product",  sack["product"])
+    k3.metric("Status",   sack["status"])
+    k4.metric("Location", sack["location_id"])
+    st.caption(
+        f"Recorded {sack['timestamp']} · {sack['weight_lbs'] or 0:.0f} lbs · "
+        f"Customer: {sack['customer_name']} · Shipped: {sack['shipped_date']} by {sack['shipped_by']}"
+    )
+
+    if sack["status"] != "Inventory":
+        st.warning("This bag is not in inventory — no actions available.")
+        return
+
+    st.markdown("---")
+    operator = st.session_state["user_display"]
+    tab_ship, tab_move, tab_consume = st.tabs(["🚢 Ship", "📍 Relocate", "🛍️ Consume"])
+
+    with tab_ship:
+        with st.form("scan_ship_form", clear_on_submit=True):
+            cust    = st.text_input("Customer Name *")
+            ship_by = st.text_input("Shipped By (driver / reference) *")
+            go      = st.form_submit_button("🚢 Ship This Bag", use_container_width=True)
+        if go:
+            if not cust.strip() or not ship_by.strip():
+                st.error("Customer name and 'Shipped By' are required.")
+            else:
+                ok, msg = storage.scan_action("ship", sack["bag_ref"], operator,
+                                              customer=cust.strip(), shipped_by=ship_by.strip())
+                (st.success if ok else st.error)(msg)
+
+    with tab_move:
+        free = storage.free_slots()
+        if not free:
+            st.error("🚨 Warehouse Full — no available locations!")
+        else:
+            new_loc = st.selectbox("Move to location", free, key="scan_new_loc")
+            if st.button("📍 Relocate", use_container_width=True):
+                ok, msg = storage.scan_action("relocate", sack["bag_ref"], operator, new_loc=new_loc)
+                (st.success if ok else st.error)(msg)
+
+    with tab_consume:
+        st.write("Mark this supersack as consumed and free its slot.")
+        if st.button("🛍️ Consume", use_container_width=True):
+            ok, msg = storage.scan_action("consume", sack["bag_ref"], operator)
+            (st.success if ok else st.error)(msg)
+
+
+# ─────────────────────────────────────────────
+#  SHIFT & CUSTOMER REPORTS  (served from the pre-computed rpt_* tables)
+# ─────────────────────────────────────────────
+def page_reports():
+    st.title("📑 Shift & Customer Reports")
+
+    sched = get_report_scheduler(site_db())
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        d1, d2 = st.columns(2)
+        date_from = d1.date_input("From", value=date.today() - pd.Timedelta(days=14), key="rpt_from")
+        date_to   = d2.date_input("To",   value=date.today(), key="rpt_to")
+    with c2:
+        st.write("")
+        if st.button("🔄 Refresh now", use_container_width=True):
+            if not sched.request().wait(REPORT_WAIT_S):
+                st.caption("Refresh still running — figures below may not include it yet.")
+
+    lo, hi = str(date_from), (pd.Timestamp(date_to) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    with snapshot_conn() as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM rpt_dirty").fetchone()[0]
+        shifts = pd.read_sql_query(
+            "SELECT * FROM rpt_shift WHERE shift_start >= ? AND shift_start < ? ORDER BY shift_start DESC, product",
+            conn, params=(lo, hi))
+        customers = pd.read_sql_query(
+            "SELECT * FROM rpt_customer WHERE shipped_date >= ? AND shipped_date < ?", conn, params=(lo, hi))
+        bagging = pd.read_sql_query(
+            "SELECT * FROM rpt_bagging WHERE day >= ? AND day < ? ORDER BY day DESC, product",
+            conn, params=(lo, hi))
+
+    last = sched.stats["last_run"]
+    st.caption(
+        f"Last refresh: {last.strftime('%H:%M:%S') if last else 'pending'} "
+        f"({sched.stats['last_s'] * 1000:.0f} ms) · {pending} period(s) waiting · "
+        f"refreshes every {sched.interval_s:.0f}s"
+        + (f" · ⚠️ last error: {sched.stats['last_error']}" if sched.stats["errors"] else "")
+    )
+
+    tab1, tab2, tab3 = st.tabs(["🕐 Shift Production", "🤝 Customer Shipments", "🛍️ Bagging Yield"])
+
+    with tab1:
+        if shifts.empty:
+            st.info("No production in this range.")
+        else:
+            hour = pd.to_datetime(shifts["shift_start"]).dt.hour
+            shifts.insert(1, "shift", hour.map(lambda h: "Day" if h == SHIFT_START_HOUR else "Night"))
+            shifts["reject_rate_%"] = (shifts["rejected"] / shifts["bags"] * 100).round(1)
+            k1, k2, k3 = st.columns(3)
+            k1.metric("Bags Produced", int(shifts["bags"].sum()))
+            k2.metric("Weight (lbs)", f"{shifts['weight_lbs'].sum():,.0f}")
+            k3.metric("QC Reject Rate", f"{shifts['rejected'].sum() / shifts['bags'].sum() * 100:.1f}%")
+            st.dataframe(shifts, use_container_width=True)
+            st.download_button("⬇️ Download CSV", shifts.to_csv(index=False).encode("utf-8"),
+                               f"shift_report_{date_from}_{date_to}.csv", "text/csv", key="rpt_dl_shift")
+
+    with tab2:
+        if customers.empty:
+            st.info("No shipments in this range.")
+        else:
+            per_cust = (
+                customers.groupby(["customer_name", "product"], as_index=False)
+                [["supersacks", "small_bags", "weight_lbs"]].sum()
+                .sort_values("weight_lbs", ascending=False)
+            )
+            st.dataframe(per_cust, use_container_width=True)
+            st.download_button("⬇️ Download CSV", per_cust.to_csv(index=False).encode("utf-8"),
+                               f"customer_report_{date_from}_{date_to}.csv", "text/csv", key="rpt_dl_cust")
+
+    with tab3:
+        if bagging.empty:
+            st.info("No bagging runs in this range.")
+        else:
+            bagging["yield_%"] = (bagging["output_lbs"] / bagging["input_lbs"] * 100).round(1)
+            total_in = bagging["input_lbs"].sum()
+            k1, k2, k3 = st.columns(3)
+            k1.metric("Bagging Runs", int(bagging["runs"].sum()))
+            k2.metric("Bags Filled", int(bagging["bags"].sum()))
+            k3.metric("Overall Yield", f"{bagging['output_lbs'].sum() / total_in * 100:.1f}%" if total_in else "—")
+            st.dataframe(bagging, use_container_width=True)
+            st.download_button("⬇️ Download CSV", bagging.to_csv(index=False).encode("utf-8"),
+                               f"bagging_report_{date_from}_{date_to}.csv", "text/csv", key="rpt_dl_bag")
+
+
+# ─────────────────────────────────────────────
+#  SEARCH RESULTS
+# ─────────────────────────────────────────────
+def page_search(query: str):
+    st.title("🔎 Search")
+
+    t0 = time.perf_counter()
+    conn = get_conn()
+    try:
+        df = search(conn, query)
+    except sqlite3.OperationalError as e:
+        st.error(f"Could not search for “{query}”: {e}")
+        return
+    finally:
+        conn.close()
+    ms = (time.perf_counter() - t0) * 1000
+
+    if df.empty:
+        st.info(f"No matches for “{query}” ({ms:.1f} ms).")
+    else:
+        more = "+" if len(df) == SEARCH_LIMIT else ""
+        st.caption(f"{len(df)}{more} result(s) for “{query}” in {ms:.1f} ms — clear the search box to go back.")
+        st.dataframe(df, use_container_width=True, height=600)
+
+
 # ─────────────────────────────────────────────
 #  MAIN
 # ─────────────────────────────────────────────
+# Pages that read the site's SQLite file directly rather than through storage
+SQLITE_ONLY_PAGES = ["🔥 Reactor Trends", "🔬 Quality Correlation", "📑 Shift & Customer Reports"]
+
+
 def main():
     st.set_page_config(page_title="RCB Inventory", page_icon="⚫", layout="wide")
-    init_db()
+    on_sqlite = STORAGE_BACKEND == "sqlite"
+    if on_sqlite:
+        for path in sites().values():
+            init_db(path)
+            get_report_scheduler(path)
 
     if not st.session_state.get("logged_in"):
         login_page()
@@ -895,6 +3423,10 @@ def main():
     with st.sidebar:
         st.title("⚫ RCB Inventory")
         st.caption(f"Logged in as: **{st.session_state['user_display']}**")
+        if len(sites()) > 1:
+            st.selectbox("🏭 Site", list(sites()), key="site")
+            st.toggle("🏢 Head office view", key="all_sites",
+                      help="Dashboard and records aggregate every plant. Entries still go to your site.")
         st.markdown("---")
 
         menu = [
@@ -902,25 +3434,62 @@ def main():
             "🏗️ Production",
             "🛍️ Bagging",
             "🚢 Shipping (FIFO)",
+            "🧭 Pick List",
+            "📷 Scan Station",
+            "🔥 Reactor Trends",
+            "🔬 Quality Correlation",
+            "📑 Shift & Customer Reports",
             "📂 Location Directory",
             "📋 View / Export Records",
         ]
+        if not on_sqlite:
+            menu = [item for item in menu if item not in SQLITE_ONLY_PAGES]
         choice = st.radio("Navigate", menu, label_visibility="collapsed")
 
+        st.markdown("---")
+        if on_sqlite:
+            query = st.text_input("🔎 Search", key="global_search",
+                                  placeholder="Bag ID, customer, pallet, driver…")
+        else:
+            query = ""
+            st.caption(f"ℹ️ Search, {', '.join(p.split(' ', 1)[1] for p in SQLITE_ONLY_PAGES)} "
+                       f"need the SQLite backend and are off while STORAGE_BACKEND = '{STORAGE_BACKEND}'.")
+        cache_box = st.empty()
+
         st.markdown("---")
         if st.button("🔒 Logout", use_container_width=True):
             for key in list(st.session_state.keys()):
                 del st.session_state[key]
             st.rerun()
 
+    cache = query_cache()
+    before = dict(cache.stats)
+
     # ── Page Router ──
-    if "Dashboard"   in choice: page_dashboard()
+    if query.strip(): page_search(query)
+    elif "Dashboard" in choice: page_dashboard()
     elif "Production" in choice: page_production()
     elif "Bagging"    in choice: page_bagging()
     elif "Shipping"   in choice: page_shipping()
+    elif "Pick"       in choice: page_picklist()
+    elif "Scan"       in choice: page_scan()
+    elif "Reactor"    in choice: page_reactor()
+    elif "Quality"    in choice: page_quality()
+    elif "Reports"    in choice: page_reports()
     elif "Location"   in choice: page_locations()
     elif "Records"    in choice: page_records()
 
+    # Search and the SQLITE_ONLY_PAGES query the database directly
+    direct = bool(query.strip()) or choice in SQLITE_ONLY_PAGES
+    hits, misses = cache.stats["hits"] - before["hits"], cache.stats["misses"] - before["misses"]
+    budget = cache.budget
+    cache_box.caption(
+        ("⚡ Query cache: not used here, this page reads the database directly · " if direct else
+         f"⚡ Query cache: this page {hits} hit(s) / {misses} database read(s) · ")
+        + f"session {cache.hit_rate():.0%} hits, {len(cache.entries)} entries, {cache.nbytes / 1e6:.1f} MB · "
+        f"all sessions {budget.nbytes / 1e6:.1f} of {budget.max_bytes / 1e6:.0f} MB"
+    )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,327 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import app
+
+CUSTOMERS = [f"Customer {i:02d}" for i in range(40)]
+OPERATORS = ["Admin", "Operator", "Night Shift", "Auto-Bot"]
+
+
+def seed(db_path: str, n_sacks: int):
+    """Fill a fresh database with `n_sacks` supersacks of realistic shape."""
+    app.DB_PATH = db_path
+    app.init_db()
+    conn = sqlite3.connect(db_path)
+    start = datetime.now() - timedelta(days=365)
+    rows = []
+    for i in range(n_sacks):
+        ts = start + timedelta(seconds=i * 365 * 86400 / n_sacks)
+        shipped = random.random() < 0.9
+        rows.append((
+            f"RCB-{ts.strftime('%Y%m%d-%H%M%S')}-{i}",
+            ts.strftime("%Y-%m-%d %H:%M:%S.%f"),
+            random.choice(OPERATORS),
+            random.choice(app.PRODUCTS),
+            f"WH-{random.randint(1, 100):03d}",
+            "Shipped" if shipped else "Inventory",
+            random.choice(CUSTOMERS) if shipped else "In Inventory",
+            ts.strftime("%Y-%m-%d") if shipped else "Not Shipped",
+            f"Truck {random.randint(1, 30)}" if shipped else "N/A",
+            2000.0,
+            random.randint(30, 60),
+            round(random.uniform(0.2, 1.2), 2),
+            random.randint(5, 25),
+            round(random.uniform(10, 14), 2),
+        ))
+    conn.executemany(
+        """INSERT INTO test_results
+           (bag_ref, timestamp, operator, product, location_id, status, customer_name,
+            shipped_date, shipped_by, weight_lbs, pellet_hardness, moisture, toluene, ash_content)
+           VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def bench_frames(n_sacks: int):
+    """Untyped SELECT * vs read_typed() for the dashboard and records views."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        seed(db_path, n_sacks)
+        print(f"Seeded {n_sacks:,} supersacks in {time.perf_counter() - t0:.1f}s\n")
+
+        cases = [
+            ("dashboard", "SELECT * FROM test_results", app.DASHBOARD_COLS),
+            ("records",   "SELECT * FROM test_results ORDER BY timestamp DESC", app.RECORDS_COLS),
+        ]
+        print(f"{'view':<10} {'SELECT * (MB)':>14} {'typed (MB)':>11} {'ratio':>6} {'SELECT * (s)':>13} {'typed (s)':>10}")
+        conn = sqlite3.connect(db_path)
+        for name, sql, cols in cases:
+            t0 = time.perf_counter()
+            raw = pd.read_sql_query(sql, conn)
+            raw["timestamp"] = pd.to_datetime(raw["timestamp"], format="ISO8601")
+            t_raw = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            order = "timestamp DESC" if "ORDER BY" in sql else ""
+            typed = app.read_typed(conn, "test_results", cols, order=order)
+            t_typed = time.perf_counter() - t0
+
+            print(f"{name:<10} {mb(raw):>14.1f} {mb(typed):>11.1f} {mb(raw) / mb(typed):>5.1f}x "
+                  f"{t_raw:>13.2f} {t_typed:>10.2f}")
+        conn.close()
+
+
+def bench_search(n_sacks: int):
+    """Global search box latency against the FTS5 index (kept in sync by triggers during seeding)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        seed(db_path, n_sacks)
+        print(f"Seeded and indexed {n_sacks:,} supersacks in {time.perf_counter() - t0:.1f}s\n")
+
+        conn = sqlite3.connect(db_path)
+        for text in ["Customer 07", "truck 1", "RCB-2025", "night", "Customer 3 Truck 12", "1"]:
+            t0 = time.perf_counter()
+            hits = app.search(conn, text)
+            ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            pd.read_sql_query("SELECT * FROM test_results", conn)     # what page_records loads today
+            scan_ms = (time.perf_counter() - t0) * 1000
+            print(f"{text!r:<24} {len(hits):>4} hit(s) {ms:>8.1f} ms   (full table load {scan_ms:,.0f} ms)")
+        conn.close()
+
+
+def bench_picklist(n_stock: int):
+    """Pick-list planning time and route length vs strict FIFO for growing orders."""
+    rng = random.Random(1)
+    slots = rng.sample(range(1, n_stock * 2 + 1), n_stock)
+    start = datetime.now() - timedelta(days=60)
+    stock = pd.DataFrame({
+        "bag_ref":     [f"RCB-{i:06d}" for i in range(n_stock)],
+        "product":     [rng.choice(app.PRODUCTS) for _ in range(n_stock)],
+        "location_id": [f"WH-{s:03d}" for s in slots],
+        "timestamp":   [start + timedelta(minutes=rng.randint(0, 60 * 24 * 60)) for _ in range(n_stock)],
+    })
+    print(f"{n_stock:,} bags in stock over {n_stock * 2:,} slots\n")
+    print(f"{'order':>6} {'tolerance':>9} {'plan (ms)':>10} {'route (m)':>10} {'strict FIFO (m)':>15} {'saved':>6}")
+    for bags in (10, 50, 200):
+        for tol_h in (0, 72):
+            order = {app.PRODUCTS[0]: bags // 2, app.PRODUCTS[1]: bags - bags // 2}
+            _, s = app.plan_picks(stock, order, pd.Timedelta(hours=tol_h))
+            print(f"{bags:>6} {tol_h:>8}h {s['ms']:>10.1f} {s['route_m']:>10,.0f} {s['fifo_route_m']:>15,.0f} "
+                  f"{1 - s['route_m'] / s['fifo_route_m']:>6.0%}")
+
+
+SCAN_BUDGET_MS = 50
+
+
+def bench_scan(n_sacks: int, lookups: int = 300) -> bool:
+    """Scan-station lookup latency (no query cache) against the <50 ms budget per scan."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        seed(db_path, n_sacks)
+        conn = sqlite3.connect(db_path)
+        sacks = [r[0] for r in conn.execute("SELECT bag_ref FROM test_results")]
+        runs = [(f"BAG-{i:07d}", sack, f"PAL-{i // 4:06d}") for i, sack in enumerate(sacks[::10])]
+        conn.executemany(
+            """INSERT INTO bagging_ops (timestamp, operator, source_sack_id, product, bag_size_unit,
+                                        quantity, pallet_id, run_ref)
+               VALUES (datetime('now'), 'Bench', ?, 'Paris CB', '25kg', 40, ?, ?)""",
+            [(sack, pallet, run_ref) for run_ref, sack, pallet in runs],
+        )
+        conn.commit()
+        conn.close()
+        print(f"Seeded {n_sacks:,} supersacks and {len(runs):,} bagging runs in {time.perf_counter() - t0:.1f}s\n")
+
+        storage = app.SQLiteStorage(db_path, cached=False)
+        rng = random.Random(1)
+        cases = {
+            "supersack label":        lambda: rng.choice(sacks),
+            "box label":              lambda: "{} | Paris CB | 25kg x 40 | {}".format(*rng.choice(runs)[::2]),
+            "box label, pallet only": lambda: f"OLD-RUN | Paris CB | 25kg x 40 | {rng.choice(runs)[2]}",
+            "unknown bag":            lambda: f"RCB-NOPE-{rng.randint(0, 10**6)}",
+        }
+        ok = True
+        print(f"{'scan':<24} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+        for name, payload in cases.items():
+            ms = []
+            for _ in range(lookups):
+                p = payload()
+                t0 = time.perf_counter()
+                app.scan_lookup(storage, p)
+                ms.append((time.perf_counter() - t0) * 1000)
+            ms.sort()
+            p95 = ms[int(len(ms) * 0.95)]
+            ok &= p95 < SCAN_BUDGET_MS
+            print(f"{name:<24} {ms[len(ms) // 2]:>9.2f} {p95:>9.2f} {ms[-1]:>9.2f}")
+        print(f"\n{'✅' if ok else '❌'} p95 {'within' if ok else 'OVER'} the {SCAN_BUDGET_MS} ms scan budget")
+        return ok
+
+
+@app.writes("test_results", "small_bags", "bagging_ops")
+def op_report_mutations(c, n: int, seed_: int = 1):
+    """A day of edits for bench_reports, including NULL and sub-second shift-boundary timestamps."""
+    rng = random.Random(seed_)
+    ids = [r[0] for r in c.execute("SELECT id FROM test_results ORDER BY random() LIMIT ?", (n * 3,))]
+    ship, move, drop = ids[:n], ids[n:2 * n], ids[2 * n:]
+    c.executemany("UPDATE test_results SET status='Shipped', customer_name=?, shipped_date=? WHERE id=?",
+                  [(rng.choice(CUSTOMERS), rng.choice([None, "2026-03-01", "2026-03-02"]), i) for i in ship])
+    c.executemany("UPDATE test_results SET timestamp=? WHERE id=?",
+                  [(rng.choice([None, "2030-04-01 17:59:59.999999", "2026-03-01 18:00:00.000000",
+                                "2026-03-02 05:59:59.9999"]), i) for i in move])
+    c.executemany("DELETE FROM test_results WHERE id=?", [(i,) for i in drop])
+    c.executemany(
+        """INSERT INTO test_results (bag_ref, timestamp, operator, product, location_id, status,
+                                     customer_name, shipped_date, weight_lbs)
+           VALUES (?, ?, 'Bench', ?, 'WH-001', ?, ?, ?, 2000.0)""",
+        [(f"MUT-{i}", rng.choice([None, "2026-03-01 05:59:59.999999", "2026-03-01 06:00:00"]),
+          rng.choice(app.PRODUCTS), rng.choice(["Inventory", "Rejected", "Shipped"]),
+          rng.choice(CUSTOMERS), rng.choice([None, "2026-03-01"])) for i in range(n)],
+    )
+    c.executemany(
+        """INSERT INTO small_bags (bag_ref, timestamp, product, bag_size_unit, status, customer_name, shipped_date)
+           VALUES (?, '2026-03-01 12:00:00', ?, '25kg', 'Shipped', ?, ?)""",
+        [(f"SB-{i}", rng.choice(app.PRODUCTS), rng.choice(CUSTOMERS), rng.choice([None, "2026-03-01"]))
+         for i in range(n)],
+    )
+    c.executemany(
+        """INSERT INTO bagging_ops (timestamp, operator, source_sack_id, product, bag_size_unit, quantity, pallet_id)
+           SELECT ?, 'Bench', bag_ref, product, '25kg', 40, 'PAL-BENCH' FROM test_results WHERE id=?""",
+        [(rng.choice([None, "2026-03-01 23:59:59.999999", "2026-03-02 00:00:00"]), i) for i in ship],
+    )
+
+
+@app.writes("rpt_shift", "rpt_customer", "rpt_bagging", "rpt_dirty")
+def op_clear_reports(c):
+    """Empty every report table and mark all periods, so the next refresh is a full recompute."""
+    for table, _, _ in app.REPORT_TABLES.values():
+        c.execute(f"DELETE FROM {table}")
+    c.execute("DELETE FROM rpt_dirty")
+    app.mark_all_report_periods(c)
+
+
+def report_rows(db_path: str) -> dict:
+    with app.snapshot_conn(db_path) as conn:
+        return {table: sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                              for row in conn.execute(f"SELECT * FROM {table}"))
+                for table, _, _ in app.REPORT_TABLES.values()}
+
+
+def reference_reports(db_path: str) -> dict:
+    """The report tables recomputed in pandas straight from the source rows — no triggers, no rpt_dirty."""
+    def rows(df):
+        return sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row)
+                      for row in df.astype(object).itertuples(index=False))
+
+    with app.snapshot_conn(db_path) as conn:
+        sacks = pd.read_sql_query("SELECT bag_ref, timestamp, product, status, weight_lbs, customer_name, "
+                                  "shipped_date FROM test_results", conn)
+        small = pd.read_sql_query("SELECT product, status, bag_size_unit, customer_name, shipped_date "
+                                  "FROM small_bags", conn)
+        runs = pd.read_sql_query("SELECT timestamp, product, quantity, bag_size_unit, source_sack_id "
+                                 "FROM bagging_ops", conn)
+    bag_lbs = {size: round(kg * 2.20462, 4) for size, kg in app.BAG_SIZE_KG.items()}
+    shift_h, span_h = pd.Timedelta(hours=app.SHIFT_START_HOUR), f"{app.SHIFT_HOURS}h"
+
+    made = sacks.dropna(subset=["timestamp"]).copy()
+    made["shift"] = ((pd.to_datetime(made["timestamp"].str[:19]) - shift_h).dt.floor(span_h) + shift_h
+                     ).dt.strftime("%Y-%m-%d %H:%M:%S")
+    made["rejected"] = (made["status"] == "Rejected").astype(int)
+    shift = made.groupby(["shift", "product"]).agg(bags=("bag_ref", "size"), lbs=("weight_lbs", "sum"),
+                                                   rejected=("rejected", "sum")).reset_index()
+
+    shipped = pd.concat([
+        sacks[sacks["status"] == "Shipped"].assign(sacks=1, small=0, lbs=lambda d: d["weight_lbs"]),
+        small[small["status"] == "Shipped"].assign(sacks=0, small=1, lbs=lambda d: d["bag_size_unit"].map(bag_lbs)),
+    ]).dropna(subset=["shipped_date"])
+    customer = shipped.groupby(["shipped_date", "customer_name", "product"])[["sacks", "small", "lbs"]].sum()
+
+    runs = runs.dropna(subset=["timestamp"]).merge(sacks[["bag_ref", "weight_lbs"]], how="left",
+                                                   left_on="source_sack_id", right_on="bag_ref")
+    runs["day"] = runs["timestamp"].str[:10]
+    runs["out"] = runs["quantity"] * runs["bag_size_unit"].map(bag_lbs).fillna(0)
+    bagging = runs.groupby(["day", "product"]).agg(runs=("quantity", "size"), bags=("quantity", "sum"),
+                                                   input=("weight_lbs", "sum"), out=("out", "sum"))
+    return {"rpt_shift": rows(shift), "rpt_customer": rows(customer.reset_index()),
+            "rpt_bagging": rows(bagging.reset_index())}
+
+
+def bench_reports(n_sacks: int, edits: int = 500) -> bool:
+    """
+    Incremental report refresh after a batch of edits, checked against an
+    independent pandas recompute of the source rows; also times a full
+    recompute through the scheduler path for comparison.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, n_sacks)
+        writer = app.get_writer(db_path)
+
+        t0 = time.perf_counter()
+        app.refresh_reports(db_path)
+        print(f"Full build over {n_sacks:,} supersacks: {time.perf_counter() - t0:.2f}s")
+
+        writer.submit(op_report_mutations, edits).result()
+        t0 = time.perf_counter()
+        periods = app.refresh_reports(db_path)
+        print(f"Incremental refresh after {edits * 6:,} edits: {periods:,} period(s) in "
+              f"{time.perf_counter() - t0:.2f}s")
+        incremental = report_rows(db_path)
+        with app.snapshot_conn(db_path) as conn:
+            left_dirty = conn.execute("SELECT COUNT(*) FROM rpt_dirty").fetchone()[0]
+        reference = reference_reports(db_path)
+
+        writer.submit(op_clear_reports).result()
+        t0 = time.perf_counter()
+        periods = app.refresh_reports(db_path)
+        print(f"Full recompute: {periods:,} period(s) in {time.perf_counter() - t0:.2f}s\n")
+        full = report_rows(db_path)
+
+        ok = left_dirty == 0
+        print(f"  {'✅' if ok else '❌'} rpt_dirty empty after refresh ({left_dirty:,} left)")
+        for table in reference:
+            same = incremental[table] == reference[table] == full[table]
+            ok &= same
+            print(f"  {'✅' if same else '❌'} {table:<13} {len(reference[table]):>6,} row(s)"
+                  + ("" if same else f" — incremental differs on "
+                                     f"{len(set(incremental[table]) ^ set(reference[table])):,}, full recompute on "
+                                     f"{len(set(full[table]) ^ set(reference[table])):,}"))
+        return ok
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="RCB inventory performance benchmarks (runs against a temp database).")
+    ap.add_argument("--rows", type=int, default=200_000, help="supersacks to seed")
+    ap.add_argument("--search", action="store_true", help="benchmark the full-text search box instead")
+    ap.add_argument("--picklist", action="store_true", help="benchmark pick-list planning (--rows = bags in stock)")
+    ap.add_argument("--scan", action="store_true", help="time scan-station lookups; exits 1 over the 50 ms budget")
+    ap.add_argument("--reports", action="store_true",
+                    help="check incremental report refresh against a full recompute; exits 1 on mismatch")
+    args = ap.parse_args()
+    if args.reports:
+        sys.exit(0 if bench_reports(args.rows) else 1)
+    elif args.scan:
+        sys.exit(0 if bench_scan(args.rows) else 1)
+    elif args.search:
+        bench_search(args.rows)
+    elif args.picklist:
+        bench_picklist(args.rows)
+    else:
+        bench_frames(args.rows)
@@ -0,0 +1,280 @@
+import argparse
+import multiprocessing as mp
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import app
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+OPERATOR_ACTIONS  = ["production", "production", "shipping", "bagging"]
+DASHBOARD_ACTIONS = ["dashboard", "records", "locations"]
+
+PAGES = {
+    "production": "🏗️ Production",
+    "shipping":   "🚢 Shipping (FIFO)",
+    "bagging":    "🛍️ Bagging",
+    "dashboard":  "📊 Dashboard",
+    "records":    "📋 View / Export Records",
+    "locations":  "📂 Location Directory",
+}
+
+
+# ─────────────────────────────────────────────
+#  SIMULATED SESSION  (one process = one browser tab)
+# ─────────────────────────────────────────────
+# AppTest swaps a process-global Runtime in and out around every run, so two
+# sessions cannot run in one process. Each session process therefore has its
+# own DBWriter, table versions and query cache — unlike production, where all
+# tabs share one Streamlit process and one group-commit writer per site.
+SETUP_NOTE = (
+    "Sessions run as separate processes, so writes do NOT go through one shared\n"
+    "group-commit writer: each session has its own writer and the database sees\n"
+    "N competing SQLite writers. Query caches are per process, so one session can\n"
+    f"read another's writes up to {app.QUERY_CACHE_TTL_S}s late. Treat lock errors and write\n"
+    "latency as an upper bound for a single-server deployment."
+)
+
+def widget(elements, label: str):
+    """
+    First widget whose label starts with `label`, skipping widgets with a
+    user key (those are page extras such as the pallet reprint box).
+    """
+    for el in elements:
+        key = getattr(el, "key", None) or ""
+        if el.label.startswith(label) and (not key or key.startswith("FormSubmitter:")):
+            return el
+    raise LookupError(label)
+
+
+def do_production(at):
+    widget(at.selectbox, "Product").set_value(random.choice(app.PRODUCTS))
+    widget(at.number_input, "Moisture").set_value(round(random.uniform(0.2, 1.1), 2))
+    widget(at.button, "✅ Record & Print Label").click()
+
+
+def do_shipping(at):
+    widget(at.selectbox, "Select Product").set_value(random.choice(app.PRODUCTS)).run()
+    if at.warning:                                   # nothing in stock for this product
+        return False
+    widget(at.text_input, "Customer Name").set_value(f"Load Customer {random.randint(1, 20)}")
+    widget(at.text_input, "Shipped By").set_value("Load Test")
+    qty = widget(at.number_input, "Number of bags to ship")
+    qty.set_value(min(qty.max, random.randint(1, 3)))
+    widget(at.button, "🚢 Confirm Shipment").click()
+
+
+def do_bagging(at):
+    if at.warning:                                   # no supersacks in stock
+        return False
+    sack = widget(at.selectbox, "Select Supersack")
+    sack.set_value(random.choice(sack.options[:5]))  # operators pick near the FIFO head
+    widget(at.text_input, "Pallet / Gaylord Box ID").set_value(f"PAL-LT-{random.randint(1, 50):03d}")
+    widget(at.number_input, "Number of bags filled").set_value(random.randint(10, 40))
+    widget(at.button, "✅ Complete Bagging Run").click()
+
+
+ACTIONS = {
+    "production": do_production,
+    "shipping":   do_shipping,
+    "bagging":    do_bagging,
+    "dashboard":  None,
+    "records":    None,
+    "locations":  None,
+}
+
+
+def classify(at) -> tuple:
+    """(outcome, shipped_qty, first error text) for the run that just finished."""
+    # A QC-rejected bag is still a successful production record
+    texts = [e.message for e in at.exception] + [e.value for e in at.error if "REJECTED" not in e.value]
+    detail = texts[0][:120] if texts else ""
+    if any("locked" in t or "busy" in t for t in texts):
+        return "lock_error", 0, detail
+    if any("Duplicate bag ID" in t for t in texts):
+        return "duplicate_id", 0, detail
+    if at.exception:
+        return "exception", 0, detail
+    if texts:
+        return "app_error", 0, detail
+    shipped = 0
+    for s in at.success:
+        m = re.search(r"Shipped \*\*(\d+) bag", s.value)
+        if m:
+            shipped = int(m.group(1))
+    return "ok", shipped, detail
+
+
+def run_session(args) -> list:
+    """Drive one simulated session until the deadline. Returns result rows."""
+    session_id, role, db_dir, start_at, deadline, think_s = args
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(db_dir)                                 # app.DB_PATH is relative
+    random.seed(session_id)
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+    at.session_state["logged_in"]    = True
+    at.session_state["user_display"] = f"LoadTest-{session_id}"
+    at.session_state["role"]         = "operator"
+    at.run()
+    time.sleep(max(0.0, start_at - time.time()))    # all sessions start together
+
+    pool = OPERATOR_ACTIONS if role == "operator" else DASHBOARD_ACTIONS
+    rows = []
+    while time.time() < deadline:
+        action = random.choice(pool)
+        t0 = time.perf_counter()
+        at.sidebar.radio[0].set_value(PAGES[action]).run()
+        act = ACTIONS[action]
+        if act is not None:
+            try:
+                if act(at) is False:
+                    rows.append((session_id, role, action, time.perf_counter() - t0, "skipped", 0, ""))
+                    continue
+                at.run()
+            except LookupError:
+                rows.append((session_id, role, action, time.perf_counter() - t0, "skipped", 0, ""))
+                continue
+        outcome, shipped, detail = classify(at)
+        rows.append((session_id, role, action, time.perf_counter() - t0, outcome, shipped, detail))
+        time.sleep(random.uniform(0, think_s))
+    return rows
+
+
+# ─────────────────────────────────────────────
+#  SETUP / INVARIANTS / REPORT
+# ─────────────────────────────────────────────
+def seed(db_path: str, slots: int, stock: int):
+    """Fresh database with `slots` warehouse slots and `stock` bags already in inventory."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE locations (loc_id TEXT PRIMARY KEY, status TEXT DEFAULT 'Available')")
+    conn.executemany("INSERT INTO locations VALUES (?, 'Available')",
+                     [(f"WH-{i:04d}",) for i in range(1, slots + 1)])
+    conn.commit()
+    conn.close()
+
+    app.DB_PATH = db_path
+    app.init_db()
+    conn = sqlite3.connect(db_path)
+    start = datetime.now() - timedelta(days=7)
+    for i in range(stock):
+        loc = f"WH-{i + 1:04d}"
+        conn.execute(
+            """INSERT INTO test_results
+               (bag_ref, timestamp, operator, product, location_id, status,
+                weight_lbs, pellet_hardness, moisture, toluene, ash_content)
+               VALUES (?,?,?,?,?,'Inventory',2000,45,0.5,15,12)""",
+            (f"SEED-{i:05d}", start + timedelta(minutes=i), "Seed", random.choice(app.PRODUCTS), loc),
+        )
+        conn.execute("UPDATE locations SET status='Occupied' WHERE loc_id=?", (loc,))
+    conn.commit()
+    conn.close()
+
+
+def check_invariants(results: pd.DataFrame) -> list:
+    """Compare what sessions were told against what the database holds."""
+    violations = []
+    with app.snapshot_conn() as conn:
+        for name, (count, _) in app.find_inventory_mismatches(conn).items():
+            if count:
+                violations.append(f"{name}: {count}")
+
+        produced = conn.execute("SELECT COUNT(*) FROM test_results WHERE bag_ref NOT LIKE 'SEED-%'").fetchone()[0]
+        shipped  = conn.execute("SELECT COUNT(*) FROM test_results WHERE status='Shipped'").fetchone()[0]
+        bagged   = conn.execute("SELECT COUNT(*) FROM bagging_ops").fetchone()[0]
+        double_bagged = conn.execute(
+            "SELECT COUNT(*) FROM (SELECT source_sack_id FROM bagging_ops GROUP BY 1 HAVING COUNT(*) > 1)"
+        ).fetchone()[0]
+
+    ok = results[results["outcome"] == "ok"]
+    told_produced = (ok["action"] == "production").sum()
+    told_shipped  = ok.loc[ok["action"] == "shipping", "shipped"].sum()
+    told_bagged   = (ok["action"] == "bagging").sum()
+
+    if produced != told_produced:
+        violations.append(f"production: sessions confirmed {told_produced} bags, database has {produced}")
+    if shipped != told_shipped:
+        violations.append(f"double-shipped: sessions confirmed {told_shipped} shipped bags, database has {shipped}")
+    if bagged != told_bagged:
+        violations.append(f"bagging: sessions confirmed {told_bagged} runs, database has {bagged}")
+    if double_bagged:
+        violations.append(f"double-bagged: {double_bagged} supersack(s) consumed by more than one run")
+    return violations
+
+
+def report(results: pd.DataFrame, wall_s: float, violations: list):
+    print(f"\n{len(results):,} page runs in {wall_s:.1f}s — {len(results) / wall_s:.1f} runs/s overall")
+    print(f"\n{SETUP_NOTE}\n")
+
+    done = results[results["outcome"] != "skipped"]
+    by_action = done.groupby("action")
+    summary = pd.DataFrame({
+        "runs":       by_action.size(),
+        "ok":         by_action["outcome"].apply(lambda s: (s == "ok").sum()),
+        "per_s":      by_action.size() / wall_s,
+        "p50_ms":     by_action["latency_s"].quantile(0.50) * 1000,
+        "p95_ms":     by_action["latency_s"].quantile(0.95) * 1000,
+        "p99_ms":     by_action["latency_s"].quantile(0.99) * 1000,
+        "lock_err":   by_action["outcome"].apply(lambda s: (s == "lock_error").sum()),
+        "dup_id":     by_action["outcome"].apply(lambda s: (s == "duplicate_id").sum()),
+        "other_err":  by_action["outcome"].apply(lambda s: s.isin(["exception", "app_error"]).sum()),
+    })
+    print(summary.round(1).to_string())
+
+    skipped = (results["outcome"] == "skipped").sum()
+    if skipped:
+        print(f"\n({skipped} run(s) skipped — nothing in stock for the chosen action)")
+
+    errors = results[results["detail"] != ""]
+    if not errors.empty:
+        print("\nMost frequent errors:")
+        for (action, detail), n in errors.groupby(["action", "detail"]).size().nlargest(5).items():
+            print(f"  {n:>5}  {action}: {detail}")
+
+    print("\nInvariants:")
+    if violations:
+        for v in violations:
+            print(f"  ❌ {v}")
+    else:
+        print("  ✅ no double-shipped bags, double-booked slots or lost writes")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Multi-session load test driving the real Streamlit pages via AppTest.")
+    ap.add_argument("--operators",  type=int,   default=10, help="sessions doing production / shipping / bagging")
+    ap.add_argument("--dashboards", type=int,   default=5,  help="sessions viewing dashboard / records / locations")
+    ap.add_argument("--duration",   type=float, default=60, help="seconds to run")
+    ap.add_argument("--warmup",     type=float, default=30, help="seconds allowed for sessions to start before timing")
+    ap.add_argument("--think",      type=float, default=0.5, help="max random pause between actions (s)")
+    ap.add_argument("--slots",      type=int,   default=1000, help="warehouse slots in the temp database")
+    ap.add_argument("--stock",      type=int,   default=300,  help="bags in inventory at start")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        seed(os.path.join(db_dir, app.DB_PATH), args.slots, args.stock)
+
+        roles = ["operator"] * args.operators + ["dashboard"] * args.dashboards
+        # Warm-up covers process spawn, streamlit import and each session's first run
+        start_at = time.time() + args.warmup
+        deadline = start_at + args.duration
+        jobs = [(i, role, db_dir, start_at, deadline, args.think) for i, role in enumerate(roles)]
+        print(f"Running {args.operators} operator + {args.dashboards} dashboard sessions "
+              f"for {args.duration:g}s against {db_dir} ...")
+
+        # One process per session: AppTest drives a single script run at a time per process
+        with mp.get_context("spawn").Pool(len(jobs)) as pool:
+            rows = [r for session_rows in pool.map(run_session, jobs) for r in session_rows]
+
+        results = pd.DataFrame(rows, columns=["session", "role", "action", "latency_s", "outcome", "shipped", "detail"])
+        report(results, args.duration, check_invariants(results))
+
+
+if __name__ == "__main__":
+    main()
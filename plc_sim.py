@@ -0,0 +1,101 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import PROCESS_CHANNELS, init_db, ingest_process_readings, sites
+
+# Nominal operating point and random-walk step for each channel
+NOMINAL = {
+    "toluene_value":  (15.0,  0.05),
+    "feed_rate":      (120.0, 0.3),
+    "reactor_1_temp": (480.0, 0.5),
+    "reactor_2_temp": (465.0, 0.5),
+    "reactor_1_hz":   (42.0,  0.05),
+    "reactor_2_hz":   (40.0,  0.05),
+}
+
+
+class ReactorSim:
+    """Stand-in for the line PLC: mean-reverting random walk per channel."""
+
+    def __init__(self):
+        self.state = {ch: NOMINAL[ch][0] for ch in PROCESS_CHANNELS}
+
+    def sample(self, ts: datetime) -> dict:
+        reading = {"timestamp": ts}
+        for ch in PROCESS_CHANNELS:
+            nominal, step = NOMINAL[ch]
+            v = self.state[ch]
+            v += random.gauss(0, step) + (nominal - v) * 0.01
+            self.state[ch] = v
+            reading[ch] = round(v, 3)
+        return reading
+
+
+def run_live(path: str, hz: float, batch_s: float, duration_s: float):
+    """Sample at `hz` into the database at `path`, flushing one batch every `batch_s` seconds."""
+    sim      = ReactorSim()
+    period   = 1.0 / hz
+    end      = time.monotonic() + duration_s if duration_s else None
+    batch    = []
+    pending  = []
+    written  = 0
+    next_tick  = time.monotonic()
+    next_flush = next_tick + batch_s
+
+    print(f"Feeding process_logs in {path} at {hz:g} Hz, batch every {batch_s:g}s (Ctrl+C to stop)...")
+    try:
+        while end is None or time.monotonic() < end:
+            batch.append(sim.sample(datetime.now()))
+            if time.monotonic() >= next_flush:
+                pending.append(ingest_process_readings(batch, path=path))
+                batch = []
+                next_flush += batch_s
+                written += sum(f.result() for f in pending if f.done())
+                pending = [f for f in pending if not f.done()]
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    if batch:
+        pending.append(ingest_process_readings(batch, path=path))
+    written += sum(f.result() for f in pending)
+    print(f"Done — {written} readings written.")
+
+
+def run_backfill(path: str, days: float, hz: float, batch_rows: int):
+    """Write `days` of history ending now into the database at `path` as fast as possible."""
+    sim   = ReactorSim()
+    step  = timedelta(seconds=1.0 / hz)
+    total = int(days * 86400 * hz)
+    ts    = datetime.now() - step * total
+    t0    = time.perf_counter()
+    futures = []
+    for start in range(0, total, batch_rows):
+        batch = []
+        for _ in range(min(batch_rows, total - start)):
+            batch.append(sim.sample(ts))
+            ts += step
+        futures.append(ingest_process_readings(batch, path=path))
+    written = sum(f.result() for f in futures)
+    secs = time.perf_counter() - t0
+    print(f"Backfilled {written:,} readings in {secs:.1f}s ({written / secs:,.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="PLC stand-in that feeds reactor telemetry into process_logs.")
+    ap.add_argument("--hz", type=float, default=10.0, help="samples per second per channel")
+    ap.add_argument("--batch-seconds", type=float, default=1.0, help="live mode: seconds per write batch")
+    ap.add_argument("--duration", type=float, default=0, help="live mode: stop after N seconds (0 = run until Ctrl+C)")
+    ap.add_argument("--backfill-days", type=float, default=0, help="write N days of history instead of running live")
+    ap.add_argument("--batch-rows", type=int, default=5000, help="backfill mode: rows per write batch")
+    ap.add_argument("--site", choices=list(sites()), default=next(iter(sites())), help="plant whose reactor this feeds")
+    args = ap.parse_args()
+
+    path = sites()[args.site]
+    init_db(path)
+    if args.backfill_days:
+        run_backfill(path, args.backfill_days, args.hz, args.batch_rows)
+    else:
+        run_live(path, args.hz, args.batch_seconds, args.duration)
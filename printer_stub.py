@@ -0,0 +1,48 @@
+import argparse
+import os
+import socketserver
+import time
+
+# Local stand-in for a raw-TCP (JetDirect / port 9100) thermal printer.
+# Counts the ^XA ... ^XZ labels it receives and optionally saves each one.
+
+SAVE_DIR = None
+received = {"labels": 0, "bytes": 0}
+
+
+class ZPLHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        t0 = time.perf_counter()
+        data = self.rfile.read()
+        labels = [chunk for chunk in data.decode("utf-8", "replace").split("^XZ") if "^XA" in chunk]
+        received["labels"] += len(labels)
+        received["bytes"]  += len(data)
+
+        if SAVE_DIR:
+            for chunk in labels:
+                n = len(os.listdir(SAVE_DIR)) + 1
+                with open(os.path.join(SAVE_DIR, f"label_{n:05d}.zpl"), "w") as f:
+                    f.write(chunk.strip() + "\n^XZ\n")
+
+        print(f"{self.client_address[0]}: {len(labels)} label(s), {len(data):,} bytes "
+              f"in {(time.perf_counter() - t0) * 1000:.0f} ms — total {received['labels']} labels")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Fake 9100 label printer for testing the ZPL spooler.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100)
+    ap.add_argument("--save-dir", help="write each received label to this folder as a .zpl file")
+    args = ap.parse_args()
+
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+        SAVE_DIR = args.save_dir
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((args.host, args.port), ZPLHandler) as server:
+        print(f"Printer stand-in listening on {args.host}:{args.port} (Ctrl+C to stop)...")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
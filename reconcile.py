@@ -0,0 +1,63 @@
+import argparse
+import sys
+import textwrap
+import time
+
+import app
+
+
+def report(results: dict) -> int:
+    total = 0
+    for name, (count, rows) in results.items():
+        desc, _, repairable = app.INVENTORY_CHECKS[name]
+        total += count
+        tag = "repairable" if repairable else "report only"
+        print(f"  {count:>8,}  {desc}  [{name}, {tag}]")
+        if count:
+            print(textwrap.indent(rows.to_string(index=False, max_colwidth=80), " " * 12))
+    return total
+
+
+def reconcile(path: str, repair: bool) -> int:
+    """Check (and optionally repair) slot status vs in-stock bags in one site database. Returns remaining issue count."""
+    app.init_db(path)
+
+    t0 = time.perf_counter()
+    with app.snapshot_conn(path) as conn:
+        results = app.find_inventory_mismatches(conn)
+    print(f"Inventory consistency check on {path} ({time.perf_counter() - t0:.2f}s):")
+    issues = report(results)
+
+    if repair and issues:
+        t0 = time.perf_counter()
+        fixed = app.get_writer(path).submit(app.op_repair_slot_status).result()
+        print(f"\nRepaired {fixed:,} slot status(es) in one transaction ({time.perf_counter() - t0:.2f}s). Re-checking:")
+        with app.snapshot_conn(path) as conn:
+            issues = report(app.find_inventory_mismatches(conn))
+
+    print("\nOK — inventory is consistent." if not issues else f"\n{issues:,} issue(s) outstanding.")
+    return issues
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Reconcile warehouse slot status against in-stock supersacks.")
+    ap.add_argument("--repair", action="store_true", help="fix slot statuses in one transaction")
+    where = ap.add_mutually_exclusive_group()
+    where.add_argument("--site", choices=list(app.sites()), help="check one plant (default: every configured plant)")
+    where.add_argument("--db", help="check this database file instead")
+    args = ap.parse_args()
+
+    if args.db:
+        paths = [args.db]
+    elif args.site:
+        paths = [app.sites()[args.site]]
+    else:
+        paths = list(app.sites().values())
+
+    issues = 0
+    for i, path in enumerate(paths):
+        if i:
+            print("\n" + "─" * 60 + "\n")
+        issues += reconcile(path, args.repair)
+    # Non-zero exit when anything is left on any site, so a nightly scheduler can alert on it
+    sys.exit(1 if issues else 0)
@@ -0,0 +1,326 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+import app
+
+# Shared conformance + benchmark suite for the storage backends in app.py.
+#   python storage_check.py                                   # SQLite (temp file)
+#   python storage_check.py --backend postgres --dsn "dbname=rcb_scratch"
+# The Postgres database must be a scratch one: every inventory table is truncated.
+
+T0 = datetime(2026, 1, 1, 6, 0)
+QC = (2000.0, 45, 0.5, 15, 12.0)
+
+
+@app.writes("test_results", "bagging_ops", "small_bags", "locations")
+def op_reset(c, slots: int):
+    """Wipe all inventory data and re-create `slots` empty warehouse slots."""
+    for table in ("test_results", "bagging_ops", "small_bags", "locations"):
+        c.execute(f"DELETE FROM {table}")
+    c.executemany("INSERT INTO locations (loc_id, status) VALUES (?, 'Available')",
+                  [(f"WH-{i:03d}",) for i in range(1, slots + 1)])
+
+
+def reset(storage, slots: int = 100):
+    """Empty every inventory table. Kept here, not on the backends, so production code cannot wipe a site."""
+    if isinstance(storage, app.PostgresStorage):
+        with storage._tx(op_reset.tables) as cur:
+            cur.execute("TRUNCATE test_results, bagging_ops, small_bags, locations RESTART IDENTITY")
+            storage._seed_slots(cur, slots)
+    else:
+        app.get_writer(storage.path).submit(op_reset, slots).result()
+
+
+def bag(storage, i: int, prod: str = "Paris CB", loc: str = "WH-001", status: str = "Inventory"):
+    return storage.record_bag(f"CHK-{i:06d}", T0 + timedelta(seconds=i), "Check", prod, loc, status, *QC)
+
+
+def slot_status(storage) -> dict:
+    with storage.snapshot() as read:
+        df = read("locations", ["loc_id", "status"])
+    return dict(zip(df["loc_id"], df["status"]))
+
+
+def in_stock(storage) -> list:
+    with storage.snapshot() as read:
+        df = read("test_results", ["bag_ref", "location_id"], "status='Inventory'", order="timestamp ASC")
+    return list(zip(df["bag_ref"], df["location_id"]))
+
+
+# ─────────────────────────────────────────────
+#  CONFORMANCE
+# ─────────────────────────────────────────────
+def check_record_bag(storage):
+    reset(storage, 5)
+    assert bag(storage, 1, loc="WH-002") == "WH-002"
+    assert bag(storage, 2, loc="WH-002") == "WH-001", "taken slot should fall back to the next free one"
+    assert slot_status(storage) == {"WH-001": "Occupied", "WH-002": "Occupied", "WH-003": "Available",
+                                    "WH-004": "Available", "WH-005": "Available"}
+    assert storage.next_free_slot() == "WH-003"
+
+
+def check_duplicate(storage):
+    reset(storage, 5)
+    bag(storage, 1)
+    try:
+        bag(storage, 1, loc="WH-002")
+    except app.DuplicateBagError:
+        pass
+    else:
+        raise AssertionError("duplicate bag_ref was accepted")
+    assert slot_status(storage)["WH-002"] == "Available", "failed insert must release its slot claim"
+
+
+def check_rejected(storage):
+    reset(storage, 2)
+    assert bag(storage, 1, loc="REJECTED", status="Rejected") == "REJECTED"
+    assert set(slot_status(storage).values()) == {"Available"}
+
+
+def check_warehouse_full(storage):
+    reset(storage, 2)
+    bag(storage, 1, loc="WH-001")
+    bag(storage, 2, loc="WH-002")
+    assert storage.next_free_slot() is None
+    assert bag(storage, 3, loc="WH-001") is None
+
+
+def check_ship_fifo(storage):
+    reset(storage, 10)
+    for i in range(6):
+        bag(storage, 10 - i, prod="Paris CB" if i % 2 else "Revolution CB", loc=f"WH-{i + 1:03d}")
+    shipped = storage.ship_fifo("Paris CB", 2, "Acme", "Truck 1", "2026-01-02")
+    assert [b for b, _ in shipped] == ["CHK-000005", "CHK-000007"], shipped   # oldest timestamps first
+    slots = slot_status(storage)
+    assert all(slots[loc] == "Available" for _, loc in shipped)
+    assert len(storage.ship_fifo("Paris CB", 5, "Acme", "Truck 1", "2026-01-02")) == 1
+    with storage.snapshot() as read:
+        n = read("test_results", ["COUNT(*) AS n"], "status='Shipped' AND customer_name=?", ("Acme",))["n"].iat[0]
+    assert n == 3
+
+
+def check_ship_bags(storage):
+    reset(storage, 5)
+    for i in range(3):
+        bag(storage, i, loc=f"WH-{i + 1:03d}")
+    shipped = storage.ship_bags(["CHK-000002", "CHK-000000", "CHK-999999"], "Acme", "Truck 1", "2026-01-02")
+    assert shipped == [("CHK-000002", "WH-003"), ("CHK-000000", "WH-001")], shipped
+    assert storage.ship_bags(["CHK-000002"], "Acme", "Truck 1", "2026-01-02") == [], "shipped twice"
+    assert [b for b, _ in in_stock(storage)] == ["CHK-000001"]
+    assert slot_status(storage)["WH-003"] == "Available"
+
+
+def check_bagging_run(storage):
+    reset(storage, 5)
+    bag(storage, 1, loc="WH-003")
+    res = storage.bagging_run(T0, "Check", "CHK-000001", "25kg", 40, "PAL-001", "BAG-1")
+    assert tuple(res) == ("Paris CB", "WH-003", "BAG-1"), res
+    assert storage.bagging_run(T0, "Check", "CHK-000001", "25kg", 40, "PAL-001", "BAG-2") is None
+    assert slot_status(storage)["WH-003"] == "Available"
+    with storage.snapshot() as read:
+        runs = read("bagging_ops", ["source_sack_id", "quantity"], "pallet_id=?", ("PAL-001",))
+    assert len(runs) == 1 and int(runs["quantity"].iat[0]) == 40
+
+
+def check_same_second_runs(storage):
+    """Lines bagging in the same second get distinct run refs, and each box label finds its own run."""
+    reset(storage, 5)
+    for i in range(3):
+        bag(storage, i, loc=f"WH-{i + 1:03d}")
+    with ThreadPoolExecutor(3) as pool:
+        refs = list(pool.map(lambda i: storage.bagging_run(T0, "Check", f"CHK-{i:06d}", "25kg", 40,
+                                                           f"PAL-{i:03d}", "BAG-1")[2], range(3)))
+    assert sorted(refs) == ["BAG-1", "BAG-1-2", "BAG-1-3"], refs
+    for i, ref in enumerate(refs):
+        assert storage.lookup_run(ref, f"PAL-{i:03d}")["source_sack_id"] == f"CHK-{i:06d}"
+
+
+def check_read_views(storage):
+    reset(storage, 3)
+    bag(storage, 1, loc="WH-002")
+    assert storage.free_slots() == ["WH-001", "WH-003"]
+    view = storage.locations_view()
+    assert list(view.columns) == list(app.LOCATION_VIEW_COLS.values())
+    assert list(view["Location"]) == ["WH-001", "WH-002", "WH-003"]
+    assert list(view["Bag ID"].fillna("")) == ["", "CHK-000001", ""]
+
+    sack = storage.lookup_bag("CHK-000001")
+    assert sack["location_id"] == "WH-002" and sack["status"] == "Inventory", sack
+    assert storage.lookup_bag("CHK-999999") is None
+
+    storage.bagging_run(T0, "Check", "CHK-000001", "25kg", 40, "PAL-001", "BAG-1")
+    assert storage.lookup_run("BAG-1", "PAL-001")["source_sack_id"] == "CHK-000001"
+    assert storage.lookup_run("BAG-9", "PAL-001")["run_ref"] == "BAG-1", "pallet_id fallback"
+    assert storage.lookup_run("BAG-9", "PAL-009") is None
+    runs = storage.pallet_runs("PAL-001")
+    assert list(runs["run_ref"]) == ["BAG-1"] and int(runs["quantity"].iat[0]) == 40
+
+
+def check_scan_action(storage):
+    reset(storage, 4)
+    for i in range(3):
+        bag(storage, i, loc=f"WH-{i + 1:03d}")
+    assert storage.scan_action("relocate", "CHK-000000", "Check", new_loc="WH-002")[0] is False, "slot is taken"
+    assert storage.scan_action("relocate", "CHK-000000", "Check", new_loc="WH-004")[0]
+    assert storage.scan_action("ship", "CHK-000001", "Check", customer="Acme", shipped_by="Truck 1")[0]
+    assert storage.scan_action("consume", "CHK-000002", "Check")[0]
+    assert storage.scan_action("consume", "CHK-000002", "Check")[0] is False, "consumed twice"
+    assert storage.scan_action("explode", "CHK-000000", "Check")[0] is False
+    assert in_stock(storage) == [("CHK-000000", "WH-004")]
+    assert slot_status(storage) == {"WH-001": "Available", "WH-002": "Available", "WH-003": "Available",
+                                    "WH-004": "Occupied"}
+    assert storage.lookup_bag("CHK-000001")["customer_name"] == "Acme"
+
+
+def check_concurrency(storage, threads: int):
+    """Parallel producers and shippers: no slot booked twice, nothing shipped twice."""
+    reset(storage, 400)
+
+    def produce(i):
+        return bag(storage, i, prod=app.PRODUCTS[i % 2], loc=storage.next_free_slot())
+
+    with ThreadPoolExecutor(threads) as pool:
+        assert all(pool.map(produce, range(300)))
+        shipped = [b for batch in pool.map(lambda i: storage.ship_fifo(app.PRODUCTS[i % 2], 5, f"C{i}", "T", "2026-01-02"),
+                                           range(40))
+                   for b in batch]
+
+    stock = in_stock(storage)
+    assert len(shipped) == len(set(shipped)) == 200, f"{len(shipped)} shipped, {len(set(shipped))} unique"
+    assert len(stock) == 100
+    assert len({loc for _, loc in stock}) == 100, "two in-stock bags share a slot"
+    occupied = {loc for loc, st_ in slot_status(storage).items() if st_ == "Occupied"}
+    assert occupied == {loc for _, loc in stock}
+
+
+def check_query_cache(storage):
+    """Repeat reads come from the cache until a write touches their table."""
+    reset(storage, 5)
+    cache = app.QueryCache()
+
+    def stock_and_slots():
+        with storage.snapshot(cache) as read:
+            return (len(read("test_results", ["bag_ref"], "status='Inventory'")),
+                    len(read("locations", ["loc_id"], "status='Available'")))
+
+    assert stock_and_slots() == (0, 5)
+    assert stock_and_slots() == (0, 5) and cache.stats == {"hits": 2, "misses": 2, "evictions": 0}
+    bag(storage, 1)
+    assert stock_and_slots() == (1, 4), "write did not invalidate the cached reads"
+    assert cache.stats["misses"] == 4
+
+    # A hit and a miss in one block come from the same commit, even when
+    # another session writes in between
+    reset(storage, 5)
+    for i in range(3):
+        bag(storage, i, loc=f"WH-{i + 1:03d}")
+    cache = app.QueryCache()
+
+    def occupied_and_stock(between=lambda: None):
+        with storage.snapshot(cache) as read:
+            occupied = len(read("locations", ["loc_id"], "status='Occupied'"))
+            between()
+            return occupied, len(read("test_results", ["bag_ref"], "status='Inventory'"))
+
+    with storage.snapshot(cache) as read:
+        read("locations", ["loc_id"], "status='Occupied'")                  # only locations is cached
+    ship = lambda: storage.ship_fifo("Paris CB", 3, "Acme", "Truck 1", "2026-01-02")
+    assert occupied_and_stock(ship) == (3, 3), "cached slots and fresh stock came from different commits"
+    assert occupied_and_stock() == (0, 0)
+
+
+def check_query_budget(storage):
+    """Sessions share one byte budget; the least recently used entry of any session goes first."""
+    reset(storage, 5)
+    with storage.snapshot(app.QueryCache()) as read:
+        size = int(read("locations", ["loc_id"]).memory_usage(deep=True).sum())
+    budget = app.QueryBudget(max_mb=2.5 * size / 1e6)
+    idle, busy = app.QueryCache(budget=budget), app.QueryCache(budget=budget)
+    for cache, where in ((idle, "status='Available'"), (busy, ""), (busy, "loc_id<>''")):
+        with storage.snapshot(cache) as read:
+            read("locations", ["loc_id"], where)
+    assert (len(idle.entries), len(busy.entries)) == (0, 2), "the idle session's entry was not evicted first"
+    assert budget.nbytes == busy.nbytes <= budget.max_bytes
+
+
+CHECKS = [check_record_bag, check_duplicate, check_rejected, check_warehouse_full,
+          check_ship_fifo, check_ship_bags, check_bagging_run, check_same_second_runs, check_read_views, check_scan_action,
+          check_query_cache, check_query_budget]
+
+
+def conformance(storage, threads: int) -> int:
+    checks = [(check.__name__, partial(check, storage)) for check in CHECKS]
+    checks.append(("check_concurrency", partial(check_concurrency, storage, threads)))
+    failures = 0
+    for name, check in checks:
+        try:
+            check()
+            print(f"  ✅ {name}")
+        except Exception as e:
+            failures += 1
+            print(f"  ❌ {name}: {type(e).__name__}: {e}")
+    return failures
+
+
+# ─────────────────────────────────────────────
+#  BENCHMARK
+# ─────────────────────────────────────────────
+def timed(label: str, n: int, fn):
+    t0 = time.perf_counter()
+    fn()
+    secs = time.perf_counter() - t0
+    print(f"  {label:<36} {n:>6,} in {secs:6.2f}s  {n / secs:>9,.0f}/s")
+
+
+def benchmark(storage, threads: int, n: int):
+    reset(storage, n + 10)
+    with ThreadPoolExecutor(threads) as pool:
+        timed(f"record_bag ({threads} threads)", n,
+              lambda: list(pool.map(lambda i: bag(storage, i, app.PRODUCTS[i % 2], "WH-001"), range(n))))
+        timed(f"ship_fifo x5 ({threads} threads)", n // 10,
+              lambda: list(pool.map(lambda i: storage.ship_fifo(app.PRODUCTS[i % 2], 5, "C", "T", "2026-01-02"),
+                                    range(n // 10))))
+
+    def views(cache=None):
+        with storage.snapshot(cache) as read:
+            read("test_results", app.DASHBOARD_COLS)
+            read("test_results", app.RECORDS_COLS, order="timestamp DESC")
+    timed("dashboard + records view reads", 20, lambda: [views() for _ in range(20)])
+    cache = app.QueryCache()
+    timed("  same, with a session query cache", 20, lambda: [views(cache) for _ in range(20)])
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Storage backend conformance + benchmark suite.")
+    ap.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    ap.add_argument("--dsn", help="Postgres DSN of a SCRATCH database (tables are truncated)")
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--ops", type=int, default=2000, help="bags recorded in the benchmark")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.backend == "postgres":
+            if not args.dsn:
+                ap.error("--dsn is required for the postgres backend")
+            storage = app.PostgresStorage(args.dsn, maxconn=args.threads + 2, cached=False)
+        else:
+            app.DB_PATH = os.path.join(tmp, "storage_check.db")
+            app.init_db()
+            storage = app.SQLiteStorage(app.DB_PATH, cached=False)
+
+        print(f"Conformance ({args.backend}):")
+        failures = conformance(storage, args.threads)
+        print(f"\nBenchmark ({args.backend}):")
+        benchmark(storage, args.threads, args.ops)
+        reset(storage)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()